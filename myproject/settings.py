@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -78,9 +81,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file (not in-memory) test database, so tests can use several connections
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Database profile: 'default' keeps SQLite's stock settings; 'production' tunes it
+# for dashboard reads running while the generator writes. Set with DJANGO_DB_PROFILE.
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'default')
+
+# PRAGMAs run on every new SQLite connection (see timetable_app/sqlite.py):
+# WAL lets readers carry on while a writer commits, busy_timeout makes a second
+# writer wait for the lock instead of failing with "database is locked",
+# synchronous=NORMAL is durable enough with WAL and fsyncs far less, and mmap_size
+# and cache_size (negative = KiB) keep hot pages in memory.
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 20000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -64000,
+}
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    DATABASES['default'].update({
+        # Keep connections open between requests so the PRAGMAs run once per connection
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+    })
+    if django.VERSION >= (5, 1):
+        # Take the write lock when a transaction starts: a deferred transaction that
+        # later upgrades to a write fails at once under WAL if another writer got in first
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/topics/auth/passwords/#password-validators
@@ -128,4 +164,17 @@ AUTH_USER_MODEL = 'timetable_app.CustomUser'
 
 # Redirect URLs for login and logout
 LOGIN_REDIRECT_URL = 'dashboard'
-LOGOUT_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home'
+
+# Cache for rendered timetable fragments (keys follow the active timetable version).
+# Local memory is per process; for several worker processes on one node use the
+# file-based backend so they share it:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'timetable',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
\ No newline at end of file
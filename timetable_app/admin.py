@@ -1,12 +1,35 @@
 from django.contrib import admin
-from .models import CustomUser, Department, Location, Professor, Subject, Stream, TimetableEntry, Task
+from .models import CustomUser, Department, Location, Professor, Subject, Stream, TimetableEntry, TimetableVersion, Task, GenerationJob, GenerationRun, ProfessorUtilization, LocationUtilization, StreamUtilization
+from .versions import touch_active_version
+
+# Edits to data shown in the timetable bump the active version's revision, like
+# the Manage Data views do, so cached grids and feeds are rebuilt with them.
+# save_related runs after the object and its many-to-many links are saved.
+class TimetableDataAdmin(admin.ModelAdmin):
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        touch_active_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        touch_active_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        touch_active_version()
 
 # Register your models here.
 admin.site.register(CustomUser)
-admin.site.register(Department)
-admin.site.register(Location)
-admin.site.register(Professor)
-admin.site.register(Subject)
-admin.site.register(Stream)
-admin.site.register(TimetableEntry)
-admin.site.register(Task)
\ No newline at end of file
+admin.site.register(Department, TimetableDataAdmin)
+admin.site.register(Location, TimetableDataAdmin)
+admin.site.register(Professor, TimetableDataAdmin)
+admin.site.register(Subject, TimetableDataAdmin)
+admin.site.register(Stream, TimetableDataAdmin)
+admin.site.register(TimetableEntry, TimetableDataAdmin)
+admin.site.register(TimetableVersion)
+admin.site.register(Task)
+admin.site.register(GenerationJob)
+admin.site.register(GenerationRun)
+admin.site.register(ProfessorUtilization)
+admin.site.register(LocationUtilization)
+admin.site.register(StreamUtilization)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import hashlib
+from django.conf import settings
+from .problem import DAYS
+from .versions import live_entries
+
+# API field name -> values_list() lookup. Responses are built straight from these
+# columns; no model instances are created.
+ENTRY_FIELDS = {
+    'id': 'id',
+    'stream': 'stream_id',
+    'stream_name': 'stream__name',
+    'subject': 'subject_id',
+    'subject_name': 'subject__name',
+    'professor': 'professor_id',
+    'professor_name': 'professor__name',
+    'location': 'location_id',
+    'location_name': 'location__name',
+    'day': 'day_of_week',
+    'timeslot': 'timeslot_id',
+    'start_time': 'timeslot__start_time',
+    'end_time': 'timeslot__end_time',
+}
+
+# Filter parameter -> entry field; each takes one id or a comma-separated list
+ENTRY_FILTERS = {
+    'stream': 'stream_id',
+    'professor': 'professor_id',
+    'location': 'location_id',
+    'timeslot': 'timeslot_id',
+}
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'TIMETABLE_API_PAGE_SIZE', 100)
+MAX_PAGE_SIZE = getattr(settings, 'TIMETABLE_API_MAX_PAGE_SIZE', 1000)
+
+def _ids(name, value):
+    try:
+        return [int(part) for part in value.split(',') if part]
+    except ValueError:
+        raise ValueError(f"'{name}' must be an id or a comma-separated list of ids.")
+
+def _positive_int(name, value, default):
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ValueError(f"'{name}' must be a non-negative integer.")
+    return number
+
+# Validated query parameters as a dict; raises ValueError with a message for
+# the client when one is malformed
+def parse_entry_query(params):
+    query = {'filters': {}}
+    for name, field in ENTRY_FILTERS.items():
+        if params.get(name):
+            query['filters'][f'{field}__in'] = _ids(name, params[name])
+    if params.get('day'):
+        days = params['day'].lower().split(',')
+        unknown = [day for day in days if day not in DAYS]
+        if unknown:
+            raise ValueError(f"'day' must be one or more of {', '.join(DAYS)}.")
+        query['filters']['day_of_week__in'] = days
+
+    fields = [name for name in params.get('fields', '').split(',') if name] or list(ENTRY_FIELDS)
+    unknown = [name for name in fields if name not in ENTRY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(ENTRY_FIELDS)}.")
+    query['fields'] = fields
+    query['after'] = _positive_int('after', params.get('after'), 0)
+    query['limit'] = min(_positive_int('limit', params.get('limit'), DEFAULT_PAGE_SIZE) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    return query
+
+def _json_value(value):
+    # Times are the only column type JSON cannot carry as is
+    if hasattr(value, 'strftime'):
+        return value.strftime('%H:%M')
+    return value
+
+# One keyset page of live entries: entries with an id above query['after'], in
+# id order. Seeking on the primary key costs the same on every page, unlike
+# OFFSET. Returns (rows, next_after) where next_after is None on the last page.
+def entry_page(query):
+    fields = query['fields']
+    lookups = ['id'] + [ENTRY_FIELDS[name] for name in fields]
+    rows = list(live_entries().filter(id__gt=query['after'], **query['filters'])
+                .order_by('id').values_list(*lookups)[:query['limit'] + 1])
+    next_after = rows[query['limit'] - 1][0] if len(rows) > query['limit'] else None
+    page = [
+        {name: _json_value(value) for name, value in zip(fields, row[1:])}
+        for row in rows[:query['limit']]
+    ]
+    return page, next_after
+
+# Strong ETag of a response: the same request against the same timetable
+# version and revision always gives the same body
+def entry_etag(cache_version, params):
+    canonical = '&'.join(f'{key}={params.get(key)}' for key in sorted(params))
+    return hashlib.sha256(f'{cache_version}?{canonical}'.encode()).hexdigest()[:32]
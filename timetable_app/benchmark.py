@@ -0,0 +1,75 @@
+import contextlib
+import io
+import time
+import tracemalloc
+from django.db import connection
+from .synthetic import SIZES, build_dataset
+from .timetable_generator import generate_timetable
+from .validation import find_data_errors
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+# Runs func and returns (value, metrics). Queries are counted on the default
+# connection of this process, so work done inside worker processes is not
+# included. Peak memory comes from tracemalloc, which slows Python down a lot, so
+# it is measured in a second run and wall time always comes from the untraced one.
+# Anything func prints is swallowed.
+def measure(func, *args, trace_memory=True, **kwargs):
+    counter = _QueryCounter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            value = func(*args, **kwargs)
+            wall = time.perf_counter() - start
+
+        peak = None
+        if trace_memory:
+            tracemalloc.start()
+            try:
+                func(*args, **kwargs)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    return value, {'wall_seconds': round(wall, 4), 'queries': counter.count, 'peak_memory_bytes': peak}
+
+# Builds each named dataset size in turn and times validation and generation on
+# it. Returns one JSON-friendly dict per size. The database's timetable data is
+# replaced by the synthetic data of the last size.
+def run_benchmark(sizes, density=0.7, seed=0, engine='greedy', time_limit=None, workers=None,
+                  restarts=1, trace_memory=True, overrides=None):
+    report = []
+    for size in sizes:
+        parameters = dict(SIZES[size], **(overrides or {}))
+        dataset, build = measure(build_dataset, density=density, seed=seed, trace_memory=False, **parameters)
+        errors, validate = measure(find_data_errors, trace_memory=trace_memory)
+        outcome, generate = measure(
+            generate_timetable, engine=engine, time_limit=time_limit, workers=workers,
+            restarts=restarts, seed=seed, trace_memory=trace_memory,
+        )
+
+        placed = len(outcome.result.placements) if outcome.result is not None else 0
+        total = placed + (len(outcome.result.unplaced) if outcome.result is not None else 0)
+        generate['placed_lectures'] = placed
+        generate['total_lectures'] = total
+        generate['placement_rate'] = round(placed / total, 4) if total else None
+        generate['saved'] = outcome.saved
+        validate['errors'] = len(errors)
+
+        report.append({
+            'size': size,
+            'dataset': dataset,
+            'engine': engine,
+            'workers': workers,
+            'restarts': restarts,
+            'build': build,
+            'validate': validate,
+            'generate': generate,
+        })
+    return report
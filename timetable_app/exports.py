@@ -0,0 +1,59 @@
+import csv
+from django.conf import settings
+from .models import Location, TimetableEntry
+from .versions import live_entries
+
+# Rows fetched from the database at a time while streaming an export
+EXPORT_CHUNK_SIZE = getattr(settings, 'TIMETABLE_EXPORT_CHUNK_SIZE', 2000)
+
+DAY_NAMES = dict(TimetableEntry.DAY_CHOICES)
+LOCATION_TYPE_NAMES = dict(Location.LOCATION_CHOICES)
+
+# csv.writer only needs an object with write(); returning the line lets every
+# writerow() call hand its encoded row straight to the response
+class Echo:
+    def write(self, value):
+        return value
+
+# Yields the CSV lines of a header and rows, one at a time
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+def _time_range(start, end):
+    if start is None:
+        return ''
+    return f"{start.strftime('%H:%M')} - {end.strftime('%H:%M')}"
+
+# Live timetable rows for the CSV export. All names come from SQL joins and rows
+# are read in chunks, so memory use does not depend on the size of the timetable.
+# Professor and location are blank for non-academic lectures.
+def timetable_rows(stream_id=None):
+    entries = live_entries()
+    if stream_id:
+        entries = entries.filter(stream_id=stream_id)
+    rows = entries.order_by('day_of_week', 'timeslot__start_time').values_list(
+        'stream__name', 'stream__division', 'stream__semester', 'stream__academic_year',
+        'day_of_week', 'timeslot__start_time', 'timeslot__end_time',
+        'subject__name', 'professor__name', 'location__name',
+    )
+    for stream, division, semester, year, day, start, end, subject, professor, location in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            f"{stream} - {division} - Sem {semester} ({year})",
+            DAY_NAMES.get(day, day),
+            _time_range(start, end),
+            subject,
+            professor or '',
+            location or '',
+        ]
+
+def location_rows(location_type=None, floor=None):
+    locations = Location.objects.all()
+    if location_type:
+        locations = locations.filter(location_type=location_type)
+    if floor:
+        locations = locations.filter(floor=floor)
+    for name, location_type, floor in locations.values_list('name', 'location_type', 'floor').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [name, LOCATION_TYPE_NAMES.get(location_type, location_type), floor]
@@ -1,11 +1,12 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
+from .importer import IMPORT_ORDER
 from .models import CustomUser, Task, Professor, Stream, Location, Subject, Department, TimeSlot
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = CustomUser
-        fields = ('username', 'email',)
+        fields = ('username', 'email', 'stream')
     
     def save(self, commit=True):
         user = super().save(commit=False)
@@ -57,4 +58,9 @@ class DepartmentForm(forms.ModelForm):
 class TimeSlotForm(forms.ModelForm):
     class Meta:
         model = TimeSlot
-        fields = ['start_time', 'end_time']
\ No newline at end of file
+        fields = ['start_time', 'end_time']
+
+# Form for uploading a CSV or JSON Lines file of one kind of data
+class DataImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[(kind, kind.title()) for kind in IMPORT_ORDER])
+    file = forms.FileField(help_text='A .csv file with a header row, or a .jsonl file with one JSON object per line.')
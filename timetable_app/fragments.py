@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from .grid import build_grids
+from .ical import feed_url
+from .versions import CACHE_TIMEOUT, cache_version
+
+FRAGMENT_TEMPLATE = 'timetable_app/timetable_grid.html'
+
+# Rendered HTML timetable grids for `owners` (Stream or Professor instances, as
+# given by kind), in order. Fragments are cached under the active timetable's
+# cache version, so a new version or a data edit makes every old fragment
+# unreachable at once; only the missing ones are built, in one batch.
+def rendered_grids(kind, owners):
+    owners = list(owners)
+    version = cache_version()
+    keys = {owner.pk: f'timetable-grid:{kind}:{owner.pk}' for owner in owners}
+    fragments = cache.get_many(keys.values(), version=version)
+
+    missing = [owner for owner in owners if keys[owner.pk] not in fragments]
+    if missing:
+        fresh = {
+            keys[grid.owner.pk]: render_to_string(FRAGMENT_TEMPLATE, {'grid': grid, 'feed_url': feed_url(kind, grid.owner.pk)})
+            for grid in build_grids(kind, missing)
+        }
+        cache.set_many(fresh, CACHE_TIMEOUT, version=version)
+        fragments.update(fresh)
+    return [mark_safe(fragments[keys[owner.pk]]) for owner in owners]
@@ -0,0 +1,106 @@
+import datetime
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from .grid import GRID_KINDS
+from .models import Professor, Stream, TimeSlot
+from .problem import DAYS, LUNCH_BREAK_START
+from .versions import CACHE_TIMEOUT, cache_version, live_entries
+
+# Shortest gap between lectures worth offering for tasks, in minutes
+MIN_WINDOW_MINUTES = getattr(settings, 'TIMETABLE_MIN_FREE_WINDOW_MINUTES', 15)
+
+# A free interval of the teaching day on a day code, as datetime.time bounds
+FreeWindow = namedtuple('FreeWindow', 'day start end')
+
+def _minutes(time):
+    return time.hour * 60 + time.minute
+
+def _time(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+def window_minutes(window):
+    return _minutes(window.end) - _minutes(window.start)
+
+# The stream or professor whose timetable a user's free time comes from, as
+# (kind, owner), or None for users tied to neither
+def timetable_owner(user):
+    if user.role == 'teacher' and user.email:
+        professor = Professor.objects.filter(email__iexact=user.email).first()
+        if professor:
+            return 'professor', professor
+    if user.stream_id:
+        return 'stream', user.stream
+    return None
+
+# Free windows of every stream or professor (as given by kind) in the live
+# timetable, keyed by owner id: the parts of the teaching day (first slot start to
+# last slot end) not taken by a lecture or the lunch break. Three queries for
+# all owners together.
+def compute_free_windows(kind):
+    slots = list(TimeSlot.objects.values_list('start_time', 'end_time'))
+    if not slots:
+        return {}
+    day_start = min(_minutes(start) for start, _ in slots)
+    day_end = max(_minutes(end) for _, end in slots)
+    lunch = [(_minutes(start), _minutes(end)) for start, end in slots if start == LUNCH_BREAK_START]
+
+    if kind == 'stream':
+        owner_days = {pk: DAYS[:min(days, len(DAYS))] for pk, days in Stream.objects.values_list('id', 'number_of_days')}
+    else:
+        owner_days = {pk: DAYS for pk in Professor.objects.values_list('id', flat=True)}
+
+    busy = {}
+    owner_field = GRID_KINDS[kind]
+    rows = (live_entries().exclude(timeslot=None).exclude(**{owner_field: None})
+            .values_list(owner_field, 'day_of_week', 'timeslot__start_time', 'timeslot__end_time').order_by())
+    for owner_id, day, start, end in rows:
+        busy.setdefault((owner_id, day), []).append((_minutes(start), _minutes(end)))
+
+    windows = {}
+    for owner_id, days in owner_days.items():
+        free = []
+        for day in days:
+            cursor = day_start
+            for start, end in sorted(busy.get((owner_id, day), []) + lunch):
+                if start - cursor >= MIN_WINDOW_MINUTES:
+                    free.append(FreeWindow(day, _time(cursor), _time(start)))
+                cursor = max(cursor, end)
+            if day_end - cursor >= MIN_WINDOW_MINUTES:
+                free.append(FreeWindow(day, _time(cursor), _time(day_end)))
+        windows[owner_id] = tuple(free)
+    return windows
+
+# Free windows of one stream or professor, in week order. They are cached per
+# owner under the active timetable's cache version; a miss computes and caches
+# every owner of the kind at once, so the dashboard never queries entries for them.
+def free_windows(kind, owner_id):
+    version = cache_version()
+    key = f'free-windows:{kind}:{owner_id}'
+    windows = cache.get(key, version=version)
+    if windows is None:
+        computed = compute_free_windows(kind)
+        cache.set_many({f'free-windows:{kind}:{pk}': value for pk, value in computed.items()},
+                       CACHE_TIMEOUT, version=version)
+        windows = computed.get(owner_id, ())
+    return windows
+
+# The windows still ahead in the current teaching week at `now` (a local
+# datetime), with today's trimmed to start no earlier than now. At the weekend
+# the whole of the next week is ahead.
+def upcoming_windows(windows, now):
+    today = now.weekday()
+    if today >= len(DAYS):
+        return list(windows)
+    current = now.hour * 60 + now.minute + (1 if now.second or now.microsecond else 0)
+    upcoming = []
+    for window in windows:
+        day = DAYS.index(window.day)
+        if day < today:
+            continue
+        if day == today:
+            if _minutes(window.end) - max(current, _minutes(window.start)) < MIN_WINDOW_MINUTES:
+                continue
+            window = window._replace(start=_time(max(current, _minutes(window.start))))
+        upcoming.append(window)
+    return upcoming
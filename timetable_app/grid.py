@@ -0,0 +1,67 @@
+from collections import namedtuple
+from django.conf import settings
+from django.core.paginator import Paginator
+from .models import TimeSlot, TimetableEntry
+from .problem import LUNCH_BREAK_START
+from .versions import live_entries
+
+# Streams shown per dashboard page when all streams are listed
+STREAMS_PER_PAGE = getattr(settings, 'TIMETABLE_GRID_STREAMS_PER_PAGE', 10)
+
+DAY_LABELS = TimetableEntry.DAY_CHOICES
+
+# One lecture in a grid cell; professor and location are None for non-academic lectures
+GridCell = namedtuple('GridCell', 'subject stream professor location')
+# A timeslot row: label, whether it is the lunch break, and one list of GridCell per day
+GridRow = namedtuple('GridRow', 'label is_lunch_break cells')
+# The week of one stream or professor (owner): its days as (code, label) pairs and a row per timeslot
+TimetableGrid = namedtuple('TimetableGrid', 'owner kind days rows')
+
+# Entry field each kind of grid is grouped by
+GRID_KINDS = {
+    'stream': 'stream_id',
+    'professor': 'professor_id',
+}
+
+def _days(kind, owner):
+    if kind == 'stream':
+        return DAY_LABELS[:min(owner.number_of_days, len(DAY_LABELS))]
+    return DAY_LABELS
+
+# Pivots the live timetable of `owners` (Stream or Professor instances, as given
+# by kind) into one day x timeslot grid each, with a single query for the
+# entries and one for the slots.
+def build_grids(kind, owners):
+    owners = list(owners)
+    owner_field = GRID_KINDS[kind]
+    timeslots = list(TimeSlot.objects.order_by('start_time', 'id').values_list('id', 'start_time', 'end_time'))
+    slot_row = {id: i for i, (id, _, _) in enumerate(timeslots)}
+
+    cells = {}
+    for owner in owners:
+        days = _days(kind, owner)
+        cells[owner.pk] = ([[[] for _ in days] for _ in timeslots], {code: i for i, (code, _) in enumerate(days)})
+
+    rows = (live_entries().filter(**{f'{owner_field}__in': cells})
+            .values_list(owner_field, 'day_of_week', 'timeslot_id', 'subject__name', 'stream__name', 'professor__name', 'location__name')
+            .order_by())
+    for owner_id, day, timeslot_id, subject, stream, professor, location in rows:
+        grid, day_column = cells[owner_id]
+        if timeslot_id in slot_row and day in day_column:
+            grid[slot_row[timeslot_id]][day_column[day]].append(GridCell(subject, stream, professor, location))
+
+    grids = []
+    for owner in owners:
+        grid, day_column = cells[owner.pk]
+        grids.append(TimetableGrid(owner, kind, DAY_LABELS[:len(day_column)], [
+            GridRow(f"{start.strftime('%H:%M')} - {end.strftime('%H:%M')}", start == LUNCH_BREAK_START, grid[i])
+            for i, (_, start, end) in enumerate(timeslots)
+        ]))
+    return grids
+
+# A page of stream grids for an ordered Stream queryset. build turns the page's
+# streams into its items (e.g. fragments.rendered_grids for cached HTML).
+def grid_page(streams, page_number=None, per_page=None, build=build_grids):
+    page = Paginator(streams, per_page or STREAMS_PER_PAGE).get_page(page_number)
+    page.object_list = build('stream', page.object_list)
+    return page
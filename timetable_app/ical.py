@@ -0,0 +1,156 @@
+import datetime
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+from .models import Location, Professor, Stream
+from .problem import DAYS
+from .versions import live_entries
+
+# Model and TimetableEntry field of each kind of feed
+FEED_KINDS = {
+    'stream': (Stream, 'stream_id'),
+    'professor': (Professor, 'professor_id'),
+    'location': (Location, 'location_id'),
+}
+
+PRODID = '-//University Timetable//Timetable Feeds//EN'
+
+# Calendar apps cannot log in, so feed URLs carry a signature of the feed instead
+_signer = signing.Signer(salt='timetable_app.ical')
+
+def feed_token(kind, pk):
+    return _signer.sign(f'{kind}:{pk}').rsplit(':', 1)[1]
+
+def valid_feed_token(kind, pk, token):
+    try:
+        _signer.unsign(f'{kind}:{pk}:{token}')
+    except signing.BadSignature:
+        return False
+    return True
+
+def feed_url(kind, pk):
+    return f"{reverse('timetable_feed', args=[kind, pk])}?token={feed_token(kind, pk)}"
+
+def _escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def _fold(line):
+    # Content lines are at most 75 octets; continuation lines start with a space
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while data:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(data))
+        # Never split a multi-byte character
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    return '\r\n '.join(parts)
+
+def _local(date, time):
+    return f"{date:%Y%m%d}T{time:%H%M%S}"
+
+# Years of UTC offset changes written into the VTIMEZONE, from the week the
+# version went live; clients carry the last offset on beyond that
+TIMEZONE_YEARS = 2
+
+def _utc_offset(offset):
+    sign = '-' if offset < datetime.timedelta(0) else '+'
+    minutes, seconds = divmod(int(abs(offset).total_seconds()), 60)
+    return f"{sign}{minutes // 60:02d}{minutes % 60:02d}" + (f"{seconds:02d}" if seconds else '')
+
+# One STANDARD or DAYLIGHT observance: the zone is at the offset of `local`
+# (an aware datetime) from the local time `onset`, reckoned in offset_from
+def _observance(onset, offset_from, local):
+    kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+    return [
+        f'BEGIN:{kind}',
+        f'DTSTART:{onset:%Y%m%dT%H%M%S}',
+        f'TZOFFSETFROM:{_utc_offset(offset_from)}',
+        f'TZOFFSETTO:{_utc_offset(local.utcoffset())}',
+        f'TZNAME:{_escape(local.tzname())}',
+        f'END:{kind}',
+    ]
+
+# The VTIMEZONE component the TZID of every event refers to (RFC 5545 3.6.5):
+# the zone's offset at `start`, then every change in the following years.
+# zoneinfo has no list of transitions, so they are found a day at a time and
+# then narrowed down to the minute.
+def _vtimezone(tzid, start):
+    zone = timezone.get_default_timezone()
+    moment = datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc)
+    local = moment.astimezone(zone)
+    offset = local.utcoffset()
+    lines = ['BEGIN:VTIMEZONE', f'TZID:{tzid}']
+    lines += _observance(datetime.datetime(1970, 1, 1), offset, local)
+    minute = datetime.timedelta(minutes=1)
+    for _ in range(TIMEZONE_YEARS * 366):
+        if (moment + 1440 * minute).astimezone(zone).utcoffset() != offset:
+            low, high = 0, 1440
+            while high - low > 1:
+                middle = (low + high) // 2
+                if (moment + middle * minute).astimezone(zone).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            change = moment + high * minute
+            lines += _observance((change + offset).replace(tzinfo=None), offset, change.astimezone(zone))
+            offset = change.astimezone(zone).utcoffset()
+        moment += 1440 * minute
+    lines.append('END:VTIMEZONE')
+    return lines
+
+# The feed of one stream, professor or location as iCalendar text: one weekly
+# recurring event per lecture, starting in the week the version went live.
+# version is the active TimetableVersion (None before the first generation).
+def build_calendar(kind, owner, version):
+    field = FEED_KINDS[kind][1]
+    published = (version.activated_at or version.created_at) if version else timezone.now()
+    local = timezone.localtime(published)
+    week_start = local.date() - datetime.timedelta(days=local.weekday())
+    stamp = published.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    tzid = settings.TIME_ZONE
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(owner)}',
+        f'X-WR-TIMEZONE:{tzid}',
+        *_vtimezone(tzid, week_start),
+    ]
+    # Event UIDs stay the same across versions, so clients need a higher
+    # SEQUENCE to take in changed times, rooms or names
+    sequence = version.revision if version else 0
+    rows = (live_entries().filter(**{field: owner.pk}).exclude(timeslot=None)
+            .order_by('day_of_week', 'timeslot__start_time')
+            .values_list('stream_id', 'subject_id', 'day_of_week', 'timeslot_id', 'timeslot__start_time', 'timeslot__end_time',
+                         'subject__name', 'stream__name', 'professor__name', 'location__name'))
+    for stream_id, subject_id, day, timeslot_id, start, end, subject, stream, professor, location in rows:
+        date = week_start + datetime.timedelta(days=DAYS.index(day))
+        description = ' / '.join(str(part) for part in (stream, professor) if part)
+        lines += [
+            'BEGIN:VEVENT',
+            # Stable across versions, so a regenerated timetable updates events in place
+            f'UID:{stream_id}-{day}-{timeslot_id}-{subject_id}@timetable',
+            f'DTSTAMP:{stamp}',
+            f'SEQUENCE:{sequence}',
+            f'DTSTART;TZID={tzid}:{_local(date, start)}',
+            f'DTEND;TZID={tzid}:{_local(date, end)}',
+            'RRULE:FREQ=WEEKLY',
+            f'SUMMARY:{_escape(subject)}',
+        ]
+        if location:
+            lines.append(f'LOCATION:{_escape(location)}')
+        if description:
+            lines.append(f'DESCRIPTION:{_escape(description)}')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
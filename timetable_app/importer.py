@@ -0,0 +1,331 @@
+import csv
+import datetime
+import json
+from collections import namedtuple
+from django.conf import settings
+from django.db import transaction
+from .incremental import mark_streams_stale
+from .models import Department, Location, Professor, Stream, Subject, TimeSlot
+from .versions import touch_active_version
+
+# Rows validated and written together
+IMPORT_BATCH_SIZE = getattr(settings, 'TIMETABLE_IMPORT_BATCH_SIZE', 1000)
+
+# An import stops collecting problems after this many
+MAX_IMPORT_ERRORS = 100
+
+# A problem with one input row; line is the line number in the file
+ImportRowError = namedtuple('ImportRowError', 'kind line message')
+
+class DataImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} row(s) could not be imported.')
+        self.errors = errors
+
+def _text(value):
+    return str(value).strip()
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('must be an integer')
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y'):
+        return True
+    if text in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError('must be true or false')
+
+def _time(value):
+    try:
+        return datetime.time.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError('must be a time as HH:MM')
+
+def _choice(choices):
+    codes = [code for code, _ in choices]
+    def parse(value):
+        value = str(value).strip()
+        if value not in codes:
+            raise ValueError(f"must be one of {', '.join(codes)}")
+        return value
+    return parse
+
+def _keys(value):
+    # A list in JSON Lines, a ';'-separated cell in CSV
+    parts = value if isinstance(value, list) else str(value).split(';')
+    return [str(part).strip() for part in parts if str(part).strip()]
+
+# How rows of one kind map onto a model. key: the fields a row is matched on
+# (upserted by); fields: {name: (parser, required)}; foreign_keys: {field:
+# (model, lookup field, required)}; many_to_many: {field: (model, lookup field)}.
+# An optional column left out (or empty) keeps the stored value, or the model
+# default for a new row; a many-to-many column given replaces all links.
+ImportSpec = namedtuple('ImportSpec', 'model key fields foreign_keys many_to_many')
+
+IMPORT_KINDS = {
+    'departments': ImportSpec(Department, ('name',), {
+        'name': (_text, True),
+    }, {}, {}),
+    'professors': ImportSpec(Professor, ('email',), {
+        'name': (_text, True),
+        'email': (_text, True),
+        'working_hours_start': (_time, True),
+        'working_hours_end': (_time, True),
+        'total_weekly_lectures': (_int, True),
+    }, {}, {'departments': (Department, 'name')}),
+    'locations': ImportSpec(Location, ('name',), {
+        'name': (_text, True),
+        'location_type': (_choice(Location.LOCATION_CHOICES), True),
+        'floor': (_int, True),
+    }, {}, {}),
+    'subjects': ImportSpec(Subject, ('code',), {
+        'name': (_text, True),
+        'code': (_text, True),
+        'lectures_per_week': (_int, True),
+        'lecture_duration_minutes': (_int, True),
+        'is_non_academic': (_bool, False),
+    }, {}, {'professors': (Professor, 'email')}),
+    'streams': ImportSpec(Stream, ('name', 'division', 'semester', 'academic_year'), {
+        'name': (_text, True),
+        'division': (_text, False),
+        'semester': (_int, True),
+        'academic_year': (_text, True),
+        'number_of_days': (_int, False),
+        'non_academic_lectures_per_week': (_int, False),
+    }, {
+        'department': (Department, 'name', True),
+        'coordinator': (Professor, 'email', False),
+    }, {'subjects': (Subject, 'code')}),
+    'timeslots': ImportSpec(TimeSlot, ('start_time', 'end_time'), {
+        'start_time': (_time, True),
+        'end_time': (_time, True),
+    }, {}, {}),
+}
+
+# Kinds in the order they can reference each other
+IMPORT_ORDER = list(IMPORT_KINDS)
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# (kind, match columns, required columns, optional columns) for each kind, for help texts
+def import_columns():
+    columns = []
+    for kind, spec in IMPORT_KINDS.items():
+        required = [name for name, (_, needed) in spec.fields.items() if needed]
+        required += [name for name, (_, _, needed) in spec.foreign_keys.items() if needed]
+        optional = [name for name, (_, needed) in spec.fields.items() if not needed]
+        optional += [name for name, (_, _, needed) in spec.foreign_keys.items() if not needed]
+        optional += list(spec.many_to_many)
+        columns.append((kind, spec.key, required, optional))
+    return columns
+
+def format_for(filename):
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f"Cannot tell the format of '{filename}'; use a .csv or .jsonl file.")
+
+# Yields (line number, row dict) from a text file, one row at a time
+def read_rows(file, file_format):
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _present(row, name):
+    value = row.get(name)
+    return value is not None and value != '' and value != []
+
+# Parses one row into (values, foreign key lookups, many-to-many lookups)
+def _parse_row(spec, row):
+    if row is None:
+        raise ValueError('Each line must be a valid JSON object.')
+    unknown = set(row) - set(spec.fields) - set(spec.foreign_keys) - set(spec.many_to_many)
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(sorted(map(str, unknown)))}.")
+    values = {}
+    for name, (parse, required) in spec.fields.items():
+        if _present(row, name):
+            try:
+                values[name] = parse(row[name])
+            except ValueError as e:
+                raise ValueError(f"'{name}' {e}.")
+        elif required:
+            raise ValueError(f"'{name}' is required.")
+    lookups = {}
+    for name, (_, _, required) in spec.foreign_keys.items():
+        if _present(row, name):
+            lookups[name] = _text(row[name])
+        elif required:
+            raise ValueError(f"'{name}' is required.")
+    links = {name: _keys(row[name]) for name in spec.many_to_many if _present(row, name)}
+    return values, lookups, links
+
+def _id_map(model, field, keys):
+    if not keys:
+        return {}
+    return dict(model.objects.filter(**{f'{field}__in': keys}).values_list(field, 'id'))
+
+# Validates and writes one batch of (line, row) pairs; returns the ids of the
+# rows created or changed and how many of each
+def _import_batch(kind, spec, batch, errors):
+    parsed = {}
+    for line, row in batch:
+        try:
+            values, lookups, links = _parse_row(spec, row)
+        except ValueError as e:
+            errors.append(ImportRowError(kind, line, str(e)))
+            continue
+        # A key repeated in the batch is written once, with its last row
+        parsed[tuple(values.get(field) for field in spec.key)] = (line, values, lookups, links)
+
+    # Every referenced record, looked up once per batch
+    fk_ids = {
+        name: _id_map(model, field, {lookups[name] for _, _, lookups, _ in parsed.values() if name in lookups})
+        for name, (model, field, _) in spec.foreign_keys.items()
+    }
+    m2m_ids = {
+        name: _id_map(model, field, {key for _, _, _, links in parsed.values() for key in links.get(name, ())})
+        for name, (model, field) in spec.many_to_many.items()
+    }
+    rows = {}
+    for key, (line, values, lookups, links) in parsed.items():
+        problems = [f"Unknown {name} '{value}'." for name, value in lookups.items() if value not in fk_ids[name]]
+        problems += [f"Unknown {spec.many_to_many[name][0]._meta.verbose_name} '{value}'."
+                     for name, keys in links.items() for value in keys if value not in m2m_ids[name]]
+        if problems:
+            errors.append(ImportRowError(kind, line, ' '.join(problems)))
+            continue
+        for name, value in lookups.items():
+            values[f'{name}_id'] = fk_ids[name][value]
+        rows[key] = (values, links)
+
+    first = spec.key[0]
+    existing = {
+        tuple(getattr(obj, field) for field in spec.key): obj
+        for obj in spec.model.objects.filter(**{f'{first}__in': {key[0] for key in rows}})
+    }
+    objects, created, updated, update_fields = {}, [], [], set()
+    for key, (values, _) in rows.items():
+        obj = existing.get(key)
+        if obj is None:
+            obj = spec.model(**values)
+            created.append(obj)
+        else:
+            changed = [name for name, value in values.items() if getattr(obj, name) != value]
+            for name in changed:
+                setattr(obj, name, values[name])
+            if changed:
+                update_fields.update(changed)
+                updated.append(obj)
+        objects[key] = obj
+    spec.model.objects.bulk_create(created)
+    if updated:
+        # An upsert on the primary key: one INSERT .. ON CONFLICT DO UPDATE per
+        # batch, far cheaper than the CASE expressions of bulk_update()
+        spec.model.objects.bulk_create(updated, update_conflicts=True, unique_fields=['id'], update_fields=sorted(update_fields))
+
+    relinked = set()
+    for name in spec.many_to_many:
+        field = spec.model._meta.get_field(name)
+        through = field.remote_field.through
+        source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+        wanted = {objects[key].pk: {m2m_ids[name][value] for value in links[name]}
+                  for key, (_, links) in rows.items() if name in links}
+        current = {}
+        existing_owners = [obj.pk for obj in existing.values() if obj.pk in wanted]
+        for owner_id, target_id in through.objects.filter(**{f'{source}__in': existing_owners}).values_list(source, target):
+            current.setdefault(owner_id, set()).add(target_id)
+        # Only owners whose links differ are rewritten
+        owners = [owner_id for owner_id, targets in wanted.items() if current.get(owner_id, set()) != targets]
+        if not owners:
+            continue
+        through.objects.filter(**{f'{source}__in': [owner_id for owner_id in owners if owner_id in current]}).delete()
+        # ignore_conflicts skips reading back ids nobody needs
+        through.objects.bulk_create([
+            through(**{source: owner_id, target: target_id})
+            for owner_id in owners for target_id in wanted[owner_id]
+        ], ignore_conflicts=True)
+        relinked.update(owners)
+
+    # A row counts as updated when its fields or its links changed
+    created_ids = {obj.pk for obj in created}
+    updated_ids = {obj.pk for obj in updated} | (relinked - created_ids)
+    return created_ids | updated_ids, len(created_ids), len(updated_ids)
+
+def _chunks(ids, size=IMPORT_BATCH_SIZE):
+    # Keeps IN lists under the database's limit on query parameters
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def _stale_stream_ids(written):
+    # Streams whose timetable an import can change: the imported streams and
+    # the streams of imported subjects and of subjects taught by imported professors
+    stream_ids = set(written.get('streams', ()))
+    for ids in _chunks(written.get('subjects', ())):
+        stream_ids.update(Stream.objects.filter(subjects__in=ids).values_list('id', flat=True))
+    for ids in _chunks(written.get('professors', ())):
+        stream_ids.update(Stream.objects.filter(subjects__professors__in=ids).values_list('id', flat=True))
+    return stream_ids
+
+# Imports files given as (kind, text file, format) in one transaction: rows are
+# read one at a time and validated and written in batches of batch_size. Rows
+# equal to what is stored are left alone. If any row is invalid nothing is saved
+# and DataImportError lists the problems. Returns {kind: (created, updated, unchanged)}.
+def import_data(sources, batch_size=None):
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    sources = sorted(sources, key=lambda source: IMPORT_ORDER.index(source[0]))
+    errors = []
+    counts = {}
+    written = {}
+    with transaction.atomic():
+        for kind, file, file_format in sources:
+            spec = IMPORT_KINDS[kind]
+            created = updated = total = 0
+            for batch in _batches(read_rows(file, file_format), batch_size):
+                changed_ids, new, changed = _import_batch(kind, spec, batch, errors)
+                written.setdefault(kind, set()).update(changed_ids)
+                created += new
+                updated += changed
+                total += len(batch)
+                if len(errors) >= MAX_IMPORT_ERRORS:
+                    break
+            counts[kind] = (created, updated, total - created - updated)
+            if len(errors) >= MAX_IMPORT_ERRORS:
+                break
+        if errors:
+            raise DataImportError(errors[:MAX_IMPORT_ERRORS])
+
+        if any(written.values()):
+            # Cached timetable views show names that may have changed
+            touch_active_version()
+            for stream_ids in _chunks(_stale_stream_ids(written)):
+                mark_streams_stale(stream_ids)
+    return counts
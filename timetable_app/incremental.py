@@ -0,0 +1,124 @@
+import time
+from django.utils import timezone
+from .instrumentation import GenerationStats
+from .models import Professor, Location, Subject, Stream, TimetableEntry, TimeSlot
+from .occupancy import OccupancyIndex
+from .problem import DAYS, load_problem
+from .solvers import build_lectures, get_solver
+from .timetable_generator import build_entries, record_run, report_unplaced, DEFAULT_BATCH_SIZE, GenerationOutcome
+from .utilization import summarize_version
+from .versions import active_version, live_entries, publish_timetable
+
+# Streams whose timetable may no longer be valid after `instance` changes. Call it
+# both before and after the change (and before a delete) and mark the union stale.
+def affected_stream_ids(instance):
+    if instance.pk is None:
+        return set()
+    if isinstance(instance, Stream):
+        return {instance.pk}
+
+    entries = TimetableEntry.objects.none()
+    streams = Stream.objects.none()
+    if isinstance(instance, Professor):
+        entries = live_entries().filter(professor=instance)
+        streams = Stream.objects.filter(subjects__professors=instance)
+    elif isinstance(instance, Subject):
+        entries = live_entries().filter(subject=instance)
+        streams = Stream.objects.filter(subjects=instance)
+    elif isinstance(instance, Location):
+        entries = live_entries().filter(location=instance)
+    elif isinstance(instance, TimeSlot):
+        entries = live_entries().filter(timeslot=instance)
+
+    stream_ids = set(entries.values_list('stream_id', flat=True).distinct())
+    stream_ids.update(streams.values_list('id', flat=True).distinct())
+    return stream_ids
+
+# stale_since lets a run that read its data before this change keep the flag set
+def mark_streams_stale(stream_ids):
+    if stream_ids:
+        Stream.objects.filter(id__in=stream_ids).update(needs_regeneration=True, stale_since=timezone.now())
+
+# Everything `version` books for streams outside `stream_ids`, as fixed occupancy
+def pinned_occupancy(problem, stream_ids, version):
+    stream_index = {stream.id: i for i, stream in enumerate(problem.streams)}
+    professor_index = {professor.id: i for i, professor in enumerate(problem.professors)}
+    location_index = {location.id: i for i, location in enumerate(problem.locations)}
+    slot_index = {timeslot.id: i for i, timeslot in enumerate(problem.timeslots)}
+    day_index = {day: i for i, day in enumerate(DAYS)}
+
+    occupancy = OccupancyIndex()
+    rows = (TimetableEntry.objects.filter(version=version).exclude(stream_id__in=stream_ids)
+            .values_list('stream_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'))
+    for stream_id, professor_id, location_id, day, timeslot_id in rows:
+        if timeslot_id not in slot_index or stream_id not in stream_index:
+            continue
+        occupancy.book(
+            stream_index[stream_id],
+            day_index[day],
+            slot_index[timeslot_id],
+            professor_index.get(professor_id),
+            location_index.get(location_id),
+        )
+    return occupancy
+
+# Regenerates only the streams flagged as needing it, around the entries of every
+# other stream in the active timetable. The result is published as a new version
+# (the other streams' entries carried over), and only if all of their lectures
+# can be placed.
+def regenerate_stale_streams(engine=None, time_limit=None, batch_size=None, progress=None, seed=None):
+    # Streams marked stale after this point stay flagged when the result is published
+    loaded_at = timezone.now()
+    stale_ids = set(Stream.objects.filter(needs_regeneration=True).values_list('id', flat=True))
+    if not stale_ids:
+        print("No streams need regeneration.")
+        return GenerationOutcome(None, [], False)
+
+    print(f"Regenerating {len(stale_ids)} stream(s)...")
+    stats = GenerationStats()
+    started_at = timezone.now()
+    start = time.perf_counter()
+    outcome = _regenerate(stats, stale_ids, loaded_at, engine, time_limit, batch_size, progress, seed)
+    parameters = {
+        'engine': engine or 'greedy',
+        'batch_size': batch_size or DEFAULT_BATCH_SIZE,
+        'time_limit': time_limit,
+        'seed': seed,
+        'streams': sorted(stale_ids),
+    }
+    record_run('incremental', parameters, stats, outcome, started_at, time.perf_counter() - start)
+    print(stats.summary())
+    return outcome
+
+def _regenerate(stats, stale_ids, loaded_at, engine, time_limit, batch_size, progress, seed):
+    with stats.phase('load'):
+        base = active_version()
+        if base is None:
+            error = "No timetable has been generated yet. Run a full generation first."
+            print(error)
+            return GenerationOutcome(None, [error], False, seed)
+        problem = load_problem()
+        stream_indexes = [i for i, stream in enumerate(problem.streams) if stream.id in stale_ids]
+        occupancy = pinned_occupancy(problem, stale_ids, base)
+
+    solver = get_solver(engine, time_limit=time_limit, seed=seed, progress=progress, stats=stats)
+    result = solver.solve(problem, build_lectures(problem, stream_indexes), occupancy)
+    if result.unplaced:
+        errors = report_unplaced(problem, result.unplaced)
+        print("The existing timetable was left unchanged.")
+        return GenerationOutcome(result, errors, False, seed)
+
+    with stats.phase('persistence'):
+        version = publish_timetable(
+            build_entries(problem, result.placements), batch_size or DEFAULT_BATCH_SIZE,
+            kind='incremental', base=base, stream_ids=stale_ids, loaded_at=loaded_at,
+        )
+    if version is None:
+        error = "The timetable was replaced by another run while regenerating; nothing was saved. Please try again."
+        print(error)
+        return GenerationOutcome(result, [error], False, seed)
+    with stats.phase('summaries'):
+        summarize_version(version)
+
+    print(f"Regenerated {len(stale_ids)} stream(s) successfully.")
+    return GenerationOutcome(result, [], True, seed, version)
@@ -0,0 +1,42 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Phase timings (seconds) and event counters collected during a generation run.
+# Phases: load, placement, non_academic, scoring, persistence. Counters:
+# candidates (day/slot/professor values evaluated), conflicts (values rejected)
+# and backtracks (assignments undone by the search).
+class GenerationStats:
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def merge(self, other):
+        # other is another GenerationStats or its as_dict(), e.g. from a worker process
+        if isinstance(other, GenerationStats):
+            other = other.as_dict()
+        for name, seconds in other['timings'].items():
+            self.timings[name] += seconds
+        self.counters.update(other['counters'])
+
+    def as_dict(self):
+        return {
+            'timings': {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+
+    def summary(self):
+        timings = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in self.timings.items())
+        counters = ', '.join(f"{name} {value}" for name, value in sorted(self.counters.items()))
+        return f"Timings: {timings or 'none'}. Counters: {counters or 'none'}."
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .incremental import regenerate_stale_streams
+from .models import GenerationJob, Stream
+from .timetable_generator import generate_timetable
+from .versions import ABANDONED_AFTER
+
+# One local worker thread, so generation jobs run one at a time in submission order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timetable-generation')
+
+# Minimum seconds between progress writes to the job row
+PROGRESS_INTERVAL = 1.0
+
+# Jobs run in the thread pool of the process that took the request, so a crash
+# or restart leaves their row queued or running for good. A job with no sign of
+# life for ABANDONED_AFTER is failed, so it no longer blocks new ones.
+def fail_abandoned_jobs():
+    cutoff = timezone.now() - ABANDONED_AFTER
+    GenerationJob.objects.filter(status__in=('queued', 'running')).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at=None, created_at__lt=cutoff),
+    ).update(
+        status='failed',
+        errors=['The job stopped responding, probably because the server was restarted. Please generate again.'],
+        finished_at=timezone.now(),
+    )
+
+def active_job():
+    fail_abandoned_jobs()
+    return GenerationJob.objects.filter(status__in=('queued', 'running')).first()
+
+# kind 'incremental' regenerates only the streams flagged needs_regeneration
+def submit_generation_job(user=None, engine='greedy', kind='full'):
+    # Only one generation at a time; a second request just gets the running job.
+    # Streams flagged meanwhile are picked up by an incremental job queued when it ends.
+    job = active_job()
+    if job:
+        return job
+    job = GenerationJob.objects.create(requested_by=user, engine=engine, kind=kind, heartbeat_at=timezone.now())
+    transaction.on_commit(lambda: _executor.submit(run_generation_job, job.pk))
+    return job
+
+class _ProgressWriter:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_write = 0
+
+    def __call__(self, placed, total):
+        now = time.monotonic()
+        if now - self.last_write >= PROGRESS_INTERVAL:
+            self.last_write = now
+            GenerationJob.objects.filter(pk=self.job_id).update(placed_lectures=placed, total_lectures=total, heartbeat_at=timezone.now())
+
+def run_generation_job(job_id):
+    close_old_connections()
+    try:
+        job = GenerationJob.objects.get(pk=job_id)
+        GenerationJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now(), heartbeat_at=timezone.now())
+        if job.kind == 'incremental':
+            outcome = regenerate_stale_streams(engine=job.engine, progress=_ProgressWriter(job_id))
+        else:
+            outcome = generate_timetable(engine=job.engine, progress=_ProgressWriter(job_id))
+
+        # An incremental job that found no stale streams had nothing to do
+        nothing_to_do = job.kind == 'incremental' and outcome.result is None and not outcome.errors
+        fields = {
+            'status': 'succeeded' if outcome.saved or nothing_to_do else 'failed',
+            'errors': outcome.errors,
+            'finished_at': timezone.now(),
+        }
+        if outcome.result is not None:
+            fields['placed_lectures'] = len(outcome.result.placements)
+            fields['total_lectures'] = len(outcome.result.placements) + len(outcome.result.unplaced)
+        GenerationJob.objects.filter(pk=job_id).update(**fields)
+        # Streams flagged while this job ran; a failed run leaves them for the next request
+        if outcome.saved and Stream.objects.filter(needs_regeneration=True).exists():
+            submit_generation_job(user=job.requested_by, engine=job.engine, kind='incremental')
+    except Exception as e:
+        GenerationJob.objects.filter(pk=job_id).update(status='failed', errors=[f'An error occurred: {e}'], finished_at=timezone.now())
+    finally:
+        # The worker thread's connection is not managed by a request cycle
+        connection.close()
@@ -0,0 +1,46 @@
+import json
+from django.core.management.base import BaseCommand
+from timetable_app.benchmark import run_benchmark
+from timetable_app.solvers import SOLVERS
+from timetable_app.synthetic import SIZES
+
+class Command(BaseCommand):
+    help = 'Benchmarks validation and timetable generation on synthetic datasets and prints the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', choices=list(SIZES), default=['tiny', 'small', 'medium'], help='Dataset sizes to run, in order.')
+        parser.add_argument('--density', type=float, default=0.7, help="Share of each stream's weekly slots filled by academic lectures.")
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the datasets and the solver.')
+        parser.add_argument('--engine', choices=sorted(SOLVERS), default='greedy', help='Solver engine used to place lectures.')
+        parser.add_argument('--time-limit', type=float, default=None, help='Search time budget in seconds for the backtracking engine.')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for clusters or restarts (0 = one per CPU).')
+        parser.add_argument('--restarts', type=int, default=1, help='Number of randomized runs per generation.')
+        parser.add_argument('--no-memory', action='store_false', dest='trace_memory', help='Skip the traced run that measures peak memory.')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            confirm = input('The benchmark replaces ALL timetable data in this database with synthetic data. '
+                            'Type "yes" to continue: ')
+            if confirm != 'yes':
+                self.stdout.write('Cancelled.')
+                return
+
+        report = run_benchmark(
+            options['sizes'],
+            density=options['density'],
+            seed=options['seed'],
+            engine=options['engine'],
+            time_limit=options['time_limit'],
+            workers=options['workers'],
+            restarts=options['restarts'],
+            trace_memory=options['trace_memory'],
+        )
+        data = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(data + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(data)
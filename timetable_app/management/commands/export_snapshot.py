@@ -0,0 +1,24 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from timetable_app.snapshot import write_snapshot
+
+class Command(BaseCommand):
+    help = ('Writes all departments, professors, locations, subjects, streams, time slots and the active timetable '
+            'to a compressed snapshot file, for restore_snapshot or offline generation (generate_timetable --snapshot).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot file to write, e.g. timetable.snapshot.gz.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            counts = write_snapshot(options['path'])
+        except OSError as e:
+            raise CommandError(f"Cannot write {options['path']}: {e.strerror}.")
+        for name, rows in counts.items():
+            self.stdout.write(f'{name}: {rows}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot written to {options['path']} ({os.path.getsize(options['path'])} bytes) "
+            f"in {time.perf_counter() - start:.2f}s."
+        ))
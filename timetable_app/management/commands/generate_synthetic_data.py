@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from timetable_app.synthetic import SIZES, build_dataset
+
+FIELDS = ('departments', 'streams', 'professors', 'subjects', 'rooms', 'labs', 'timeslots')
+
+class Command(BaseCommand):
+    help = 'Replaces all timetable data with a synthetic university of the given size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(SIZES), default='small', help='Preset to start from; the options below override it.')
+        parser.add_argument('--departments', type=int, help='Number of departments.')
+        parser.add_argument('--streams', type=int, help='Number of streams.')
+        parser.add_argument('--professors', type=int, help='Number of professors.')
+        parser.add_argument('--subjects', type=int, help='Academic subjects per stream.')
+        parser.add_argument('--rooms', type=int, help='Number of classrooms.')
+        parser.add_argument('--labs', type=int, help='Number of labs.')
+        parser.add_argument('--timeslots', type=int, help='Teaching slots per day (a lunch break is added).')
+        parser.add_argument('--density', type=float, default=0.7, help="Share of each stream's weekly slots filled by academic lectures.")
+        parser.add_argument('--non-academic', type=int, default=1, help='Non-academic lectures per stream per week.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed builds the same data.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['density'] <= 1:
+            raise CommandError('--density must be between 0 and 1.')
+        if options['interactive']:
+            confirm = input('This will DELETE all departments, streams, subjects, professors, locations, '
+                            'time slots and timetable entries. Type "yes" to continue: ')
+            if confirm != 'yes':
+                self.stdout.write('Cancelled.')
+                return
+
+        parameters = dict(SIZES[options['size']])
+        parameters.update({field: options[field] for field in FIELDS if options[field] is not None})
+        dataset = build_dataset(
+            density=options['density'],
+            non_academic=options['non_academic'],
+            seed=options['seed'],
+            **parameters,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {dataset['streams']} streams, {dataset['professors']} professors, {dataset['subjects']} subjects, "
+            f"{dataset['rooms'] + dataset['labs']} locations and {dataset['timeslots']} daily slots "
+            f"({dataset['lectures']} lectures per week)."
+        ))
@@ -1,13 +1,76 @@
-from django.core.management.base import BaseCommand
-from timetable_app.timetable_generator import generate_timetable
+import cProfile
+import io
+import pstats
+from django.core.management.base import BaseCommand, CommandError
+from timetable_app.incremental import regenerate_stale_streams
+from timetable_app.snapshot import read_snapshot, snapshot_problem
+from timetable_app.solvers import SOLVERS
+from timetable_app.timetable_generator import generate_timetable, solve_offline
 
 class Command(BaseCommand):
     help = 'Generates the university timetable automatically.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per INSERT when saving timetable entries.')
+        parser.add_argument('--engine', choices=sorted(SOLVERS), default='greedy', help='Solver engine used to place lectures.')
+        parser.add_argument('--time-limit', type=float, default=None, help='Search time budget in seconds for the backtracking engine.')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used to solve independent stream clusters or restarts in parallel (0 = one per CPU).')
+        parser.add_argument('--restarts', type=int, default=1, help='Number of randomized runs; the best-scoring timetable is kept.')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed of the (first) run, for reproducible results.')
+        parser.add_argument('--incremental', action='store_true', help='Only regenerate streams affected by data changes since the last run.')
+        parser.add_argument('--snapshot', metavar='FILE', default=None, help='Solve the problem stored in this export_snapshot file without the database; nothing is saved.')
+        parser.add_argument('--profile', action='store_true', help='Run under cProfile and print the slowest calls.')
+        parser.add_argument('--profile-output', default=None, help='Also dump the raw cProfile data to this file (readable with pstats/snakeviz).')
+        parser.add_argument('--profile-limit', type=int, default=30, help='Number of functions shown in the --profile report.')
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('Starting timetable generation...'))
+        # An incremental run solves the stale streams once, around the fixed rest of the timetable
+        if options['incremental'] and (options['workers'] is not None or options['restarts'] != 1):
+            raise CommandError('--workers and --restarts cannot be combined with --incremental.')
+        if options['incremental'] and options['snapshot']:
+            raise CommandError('--snapshot cannot be combined with --incremental.')
         try:
-            generate_timetable()
-            self.stdout.write(self.style.SUCCESS('Timetable generation finished successfully.'))
+            if options['profile'] or options['profile_output']:
+                profiler = cProfile.Profile()
+                outcome = profiler.runcall(self.generate, options)
+                if options['profile_output']:
+                    profiler.dump_stats(options['profile_output'])
+                    self.stdout.write(f"Profile data written to {options['profile_output']}")
+                # pstats writes piecemeal; collect the report so stdout gets it in one go
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(options['profile_limit'])
+                self.stdout.write(report.getvalue())
+            else:
+                outcome = self.generate(options)
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'An error occurred: {e}'))
\ No newline at end of file
+            raise CommandError(f'An error occurred: {e}') from e
+        # The problems themselves were printed by the run
+        if outcome.errors:
+            raise CommandError(f'Timetable generation failed with {len(outcome.errors)} problem(s); nothing was saved.')
+        self.stdout.write(self.style.SUCCESS('Timetable generation finished successfully.'))
+
+    def generate(self, options):
+        if options['snapshot']:
+            return solve_offline(
+                snapshot_problem(read_snapshot(options['snapshot'])),
+                engine=options['engine'],
+                time_limit=options['time_limit'],
+                workers=options['workers'],
+                restarts=options['restarts'],
+                seed=options['seed'],
+            )
+        if options['incremental']:
+            return regenerate_stale_streams(
+                engine=options['engine'],
+                time_limit=options['time_limit'],
+                batch_size=options['batch_size'],
+                seed=options['seed'],
+            )
+        return generate_timetable(
+            batch_size=options['batch_size'],
+            engine=options['engine'],
+            time_limit=options['time_limit'],
+            workers=options['workers'],
+            restarts=options['restarts'],
+            seed=options['seed'],
+        )
\ No newline at end of file
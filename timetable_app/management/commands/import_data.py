@@ -0,0 +1,42 @@
+import contextlib
+import time
+from django.core.management.base import BaseCommand, CommandError
+from timetable_app.importer import IMPORT_FORMATS, IMPORT_ORDER, DataImportError, format_for, import_data
+
+class Command(BaseCommand):
+    help = ('Creates or updates departments, professors, locations, subjects, streams and time slots from CSV or '
+            'JSON Lines files, all in one transaction. Rows are matched on email (professors), code (subjects), '
+            'name (departments, locations), name/division/semester/academic year (streams) and start/end time (time slots).')
+
+    def add_arguments(self, parser):
+        for kind in IMPORT_ORDER:
+            parser.add_argument(f'--{kind}', metavar='FILE', help=f'File of {kind} to import.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Format of every file; by default taken from the file extension.')
+        parser.add_argument('--batch-size', type=int, help='Rows validated and written per batch.')
+
+    def handle(self, *args, **options):
+        paths = [(kind, options[kind]) for kind in IMPORT_ORDER if options[kind]]
+        if not paths:
+            raise CommandError("Give at least one file to import, e.g. --professors professors.csv.")
+        try:
+            formats = {kind: options['format'] or format_for(path) for kind, path in paths}
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        with contextlib.ExitStack() as files:
+            try:
+                sources = [(kind, files.enter_context(open(path, encoding='utf-8-sig', newline='')), formats[kind])
+                           for kind, path in paths]
+            except OSError as e:
+                raise CommandError(f'Cannot read {e.filename}: {e.strerror}.')
+            try:
+                counts = import_data(sources, options['batch_size'])
+            except DataImportError as e:
+                for error in e.errors:
+                    self.stdout.write(self.style.WARNING(f'- {error.kind} line {error.line}: {error.message}'))
+                raise CommandError(f'{e} Nothing was imported.')
+
+        for kind, (created, updated, unchanged) in counts.items():
+            self.stdout.write(f'{kind}: {created} created, {updated} updated, {unchanged} unchanged')
+        self.stdout.write(self.style.SUCCESS(f'Import finished in {time.perf_counter() - start:.2f}s.'))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from timetable_app.snapshot import read_snapshot, restore_snapshot
+
+class Command(BaseCommand):
+    help = ('Replaces all departments, professors, locations, subjects, streams, time slots and timetables with '
+            'the contents of a snapshot file written by export_snapshot, keeping its ids.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Snapshot file to restore.')
+        parser.add_argument('--batch-size', type=int, help='Rows per INSERT.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        try:
+            snapshot = read_snapshot(options['path'])
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e.strerror}.")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['interactive']:
+            confirm = input(f'This will DELETE all departments, streams, subjects, professors, locations, time slots '
+                            f'and timetables and replace them with the snapshot taken {snapshot.created_at}. '
+                            f'Type "yes" to continue: ')
+            if confirm != 'yes':
+                self.stdout.write('Cancelled.')
+                return
+
+        start = time.perf_counter()
+        counts = restore_snapshot(snapshot, options['batch_size'])
+        for name, rows in counts.items():
+            self.stdout.write(f'{name}: {rows}')
+        self.stdout.write(self.style.SUCCESS(f'Snapshot restored in {time.perf_counter() - start:.2f}s.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0005_stream_non_academic_lectures_per_week_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='needs_regeneration',
+            field=models.BooleanField(default=False),
+        ),
+    ]
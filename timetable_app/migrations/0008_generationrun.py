@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0007_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=12)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('parameters', models.JSONField(blank=True, default=dict)),
+                ('saved', models.BooleanField(default=False)),
+                ('placed_lectures', models.IntegerField(default=0)),
+                ('unplaced_lectures', models.IntegerField(default=0)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('counters', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def adopt_existing_entries(apps, schema_editor):
+    # Whatever timetable is already stored becomes the first active version
+    TimetableEntry = apps.get_model('timetable_app', 'TimetableEntry')
+    TimetableVersion = apps.get_model('timetable_app', 'TimetableVersion')
+    if TimetableEntry.objects.exists():
+        now = django.utils.timezone.now()
+        version = TimetableVersion.objects.create(status='active', activated_at=now)
+        TimetableEntry.objects.update(version=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0008_generationrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('building', 'Building'), ('active', 'Active'), ('retired', 'Retired')], default='building', max_length=10)),
+                ('kind', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('retired_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('status',), name='single_active_timetable_version')],
+            },
+        ),
+        migrations.AddField(
+            model_name='generationrun',
+            name='version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='timetable_app.timetableversion'),
+        ),
+        migrations.AddField(
+            model_name='timetableentry',
+            name='version',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='timetable_app.timetableversion'),
+        ),
+        migrations.RunPython(adopt_existing_entries, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timetableentry',
+            name='version',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='timetable_app.timetableversion'),
+        ),
+    ]
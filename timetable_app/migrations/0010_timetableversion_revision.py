@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0009_timetableversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetableversion',
+            name='revision',
+            field=models.IntegerField(default=0),
+        ),
+    ]
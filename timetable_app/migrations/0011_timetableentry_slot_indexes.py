@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+# Timetables written by the old generator can book a professor or room twice in
+# one slot, which the constraints below forbid. All but the first entry of each
+# such clash move to retired holding versions (as many as needed so they do not
+# clash there either), and their streams are flagged for regeneration.
+def move_double_bookings(apps, schema_editor):
+    TimetableEntry = apps.get_model('timetable_app', 'TimetableEntry')
+    TimetableVersion = apps.get_model('timetable_app', 'TimetableVersion')
+    Stream = apps.get_model('timetable_app', 'Stream')
+
+    doubled = set()
+    for field in ('professor', 'location'):
+        clashes = (TimetableEntry.objects.exclude(**{field: None})
+                   .values('version', field, 'day_of_week', 'timeslot')
+                   .annotate(n=Count('id')).filter(n__gt=1).values_list('version', field, 'day_of_week', 'timeslot'))
+        for version_id, owner_id, day, timeslot_id in clashes:
+            ids = (TimetableEntry.objects.filter(version_id=version_id, day_of_week=day, timeslot_id=timeslot_id,
+                                                 **{f'{field}_id': owner_id})
+                   .order_by('id').values_list('id', flat=True))
+            doubled.update(ids[1:])
+    if not doubled:
+        return
+
+    layers = {}
+    entries = TimetableEntry.objects.filter(id__in=doubled).order_by('id')
+    for entry in entries.values('id', 'version_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'):
+        keys = {(kind, entry[f'{kind}_id'], entry['day_of_week'], entry['timeslot_id'])
+                for kind in ('professor', 'location') if entry[f'{kind}_id'] is not None}
+        version_layers = layers.setdefault(entry['version_id'], [])
+        layer = next((layer for layer in version_layers if not keys & layer['keys']), None)
+        if layer is None:
+            layer = {'keys': set(), 'ids': []}
+            version_layers.append(layer)
+        layer['keys'] |= keys
+        layer['ids'].append(entry['id'])
+
+    now = timezone.now()
+    for version_id, version_layers in layers.items():
+        kind = TimetableVersion.objects.get(pk=version_id).kind
+        for layer in version_layers:
+            holding = TimetableVersion.objects.create(kind=kind, status='retired', retired_at=now)
+            TimetableEntry.objects.filter(id__in=layer['ids']).update(version=holding)
+    stream_ids = set(TimetableEntry.objects.filter(id__in=doubled).values_list('stream_id', flat=True))
+    Stream.objects.filter(id__in=stream_ids).update(needs_regeneration=True)
+    print(f"\n  Moved {len(doubled)} double-booked timetable entries to retired versions; "
+          f"{len(stream_ids)} stream(s) need regeneration (generate_timetable --incremental).")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0010_timetableversion_revision'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_double_bookings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timetableentry',
+            index=models.Index(fields=['version', 'stream', 'day_of_week', 'timeslot'], name='entry_stream_slot_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timetableentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('professor__isnull', False)), fields=('version', 'professor', 'day_of_week', 'timeslot'), name='unique_professor_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='timetableentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('location__isnull', False)), fields=('version', 'location', 'day_of_week', 'timeslot'), name='unique_location_slot'),
+        ),
+    ]
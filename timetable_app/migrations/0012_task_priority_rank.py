@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+def rank_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('timetable_app', 'Task')
+    Task.objects.filter(priority='high').update(priority_rank=0)
+    Task.objects.filter(priority='low').update(priority_rank=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0011_timetableentry_slot_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'is_scheduled', 'is_completed'], name='task_user_state_idx'),
+        ),
+        migrations.RunPython(rank_existing_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0012_task_priority_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='stream',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='students', to='timetable_app.stream'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='scheduled_day',
+            field=models.CharField(blank=True, choices=[('mon', 'Monday'), ('tue', 'Tuesday'), ('wed', 'Wednesday'), ('thu', 'Thursday'), ('fri', 'Friday')], max_length=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='scheduled_start',
+            field=models.TimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0013_task_placement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booked_slots', models.IntegerField()),
+                ('available_slots', models.IntegerField()),
+                ('utilization_percent', models.FloatField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timetable_app.location')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_utilization', to='timetable_app.timetableversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'location'), name='unique_location_utilization')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfessorUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_lectures', models.IntegerField()),
+                ('weekly_limit', models.IntegerField()),
+                ('load_percent', models.FloatField()),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timetable_app.professor')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='professor_utilization', to='timetable_app.timetableversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'professor'), name='unique_professor_utilization')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StreamUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_lectures', models.IntegerField()),
+                ('teaching_days', models.IntegerField()),
+                ('gap_slots', models.IntegerField()),
+                ('stream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timetable_app.stream')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stream_utilization', to='timetable_app.timetableversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'stream'), name='unique_stream_utilization')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0015_generationjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='kind',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable_app', '0016_generationjob_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='stale_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
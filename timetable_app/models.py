@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 # We will create a custom user model to handle different user roles (Admin, Student, Teacher).
@@ -9,6 +10,7 @@ class CustomUser(AbstractUser):
         ('student', 'Student'),
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
+    stream = models.ForeignKey('Stream', on_delete=models.SET_NULL, null=True, blank=True, related_name='students') # A student's own stream
     
     class Meta:
         verbose_name = 'User'
@@ -71,6 +73,8 @@ class Stream(models.Model):
     non_academic_lectures_per_week = models.IntegerField(default=0) # New field
     coordinator = models.ForeignKey(Professor, on_delete=models.SET_NULL, null=True, related_name='coordinated_streams')
     subjects = models.ManyToManyField(Subject)
+    needs_regeneration = models.BooleanField(default=False) # Set when a data change affects this stream's timetable
+    stale_since = models.DateTimeField(null=True, blank=True) # When needs_regeneration was last set
 
     def __str__(self):
         return f"{self.name} - {self.division} - Sem {self.semester} ({self.academic_year})"
@@ -83,6 +87,34 @@ class TimeSlot(models.Model):
     def __str__(self):
         return f"{self.start_time.strftime('%H:%M')} - {self.end_time.strftime('%H:%M')}"
 
+# Model for a generated timetable. Generation fills a new 'building' version and only
+# flips it to 'active' once it is complete, so readers keep using the previous one.
+class TimetableVersion(models.Model):
+    STATUS_CHOICES = (
+        ('building', 'Building'),
+        ('active', 'Active'),
+        ('retired', 'Retired'),
+    )
+    KIND_CHOICES = (
+        ('full', 'Full'),
+        ('incremental', 'Incremental'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='building')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default='full')
+    created_at = models.DateTimeField(default=timezone.now)
+    activated_at = models.DateTimeField(null=True, blank=True)
+    retired_at = models.DateTimeField(null=True, blank=True)
+    revision = models.IntegerField(default=0) # Bumped by data edits shown in the active timetable and by each new active version
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status='active'), name='single_active_timetable_version'),
+        ]
+
+    def __str__(self):
+        return f"Timetable version {self.pk} ({self.status})"
+
 # Model for a single entry in the timetable.
 class TimetableEntry(models.Model):
     DAY_CHOICES = (
@@ -92,6 +124,7 @@ class TimetableEntry(models.Model):
         ('thu', 'Thursday'),
         ('fri', 'Friday'),
     )
+    version = models.ForeignKey(TimetableVersion, on_delete=models.CASCADE, related_name='entries')
     stream = models.ForeignKey(Stream, on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     professor = models.ForeignKey(Professor, on_delete=models.CASCADE, null=True, blank=True)
@@ -102,10 +135,127 @@ class TimetableEntry(models.Model):
     class Meta:
         verbose_name_plural = "Timetable Entries"
         ordering = ['day_of_week', 'timeslot__start_time']
+        # Lookups by stream, professor or room for a day/slot of a version are index seeks.
+        # The professor and room keys are unique, so no code path can double-book them.
+        indexes = [
+            models.Index(fields=['version', 'stream', 'day_of_week', 'timeslot'], name='entry_stream_slot_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['version', 'professor', 'day_of_week', 'timeslot'],
+                condition=models.Q(professor__isnull=False),
+                name='unique_professor_slot',
+            ),
+            models.UniqueConstraint(
+                fields=['version', 'location', 'day_of_week', 'timeslot'],
+                condition=models.Q(location__isnull=False),
+                name='unique_location_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.stream} | {self.subject} | {self.day_of_week} ({self.timeslot})"
 
+# Model for a timetable generation run submitted from the dashboard and executed in the background.
+class GenerationJob(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    KIND_CHOICES = (
+        ('full', 'Full'),
+        ('incremental', 'Incremental'), # Only the streams flagged needs_regeneration
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default='full')
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    engine = models.CharField(max_length=20, default='greedy')
+    placed_lectures = models.IntegerField(default=0)
+    total_lectures = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) # Last sign of life from the worker running the job
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        return round((end - self.started_at).total_seconds(), 1)
+
+    def __str__(self):
+        return f"Generation job {self.pk} ({self.status})"
+
+# Model for the history of generation runs: parameters, outcome, phase timings and counters.
+class GenerationRun(models.Model):
+    KIND_CHOICES = (
+        ('full', 'Full'),
+        ('incremental', 'Incremental'),
+    )
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default='full')
+    started_at = models.DateTimeField(default=timezone.now)
+    duration_seconds = models.FloatField(default=0)
+    parameters = models.JSONField(default=dict, blank=True)
+    saved = models.BooleanField(default=False)
+    placed_lectures = models.IntegerField(default=0)
+    unplaced_lectures = models.IntegerField(default=0)
+    timings = models.JSONField(default=dict, blank=True)
+    counters = models.JSONField(default=dict, blank=True)
+    version = models.ForeignKey(TimetableVersion, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} run at {self.started_at:%Y-%m-%d %H:%M} ({self.duration_seconds:.2f}s)"
+
+# Utilization summaries of a timetable version, written by utilization.summarize_version()
+# at the end of each generation run so reports never aggregate TimetableEntry themselves.
+class ProfessorUtilization(models.Model):
+    version = models.ForeignKey(TimetableVersion, on_delete=models.CASCADE, related_name='professor_utilization')
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+    scheduled_lectures = models.IntegerField()
+    weekly_limit = models.IntegerField() # The professor's total_weekly_lectures when the version was generated
+    load_percent = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'professor'], name='unique_professor_utilization'),
+        ]
+
+class LocationUtilization(models.Model):
+    version = models.ForeignKey(TimetableVersion, on_delete=models.CASCADE, related_name='location_utilization')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE)
+    booked_slots = models.IntegerField()
+    available_slots = models.IntegerField() # Teaching slots in a week
+    utilization_percent = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'location'], name='unique_location_utilization'),
+        ]
+
+class StreamUtilization(models.Model):
+    version = models.ForeignKey(TimetableVersion, on_delete=models.CASCADE, related_name='stream_utilization')
+    stream = models.ForeignKey(Stream, on_delete=models.CASCADE)
+    scheduled_lectures = models.IntegerField()
+    teaching_days = models.IntegerField()
+    gap_slots = models.IntegerField() # Free teaching slots between the first and last lecture of a day, over the week
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'stream'], name='unique_stream_utilization'),
+        ]
+
 # Model for user tasks.
 class Task(models.Model):
     PRIORITY_CHOICES = (
@@ -113,13 +263,29 @@ class Task(models.Model):
         ('medium', 'Medium'),
         ('low', 'Low'),
     )
+    # Sort key of each priority, most urgent first; the priority strings do not sort that way
+    PRIORITY_RANKS = {'high': 0, 'medium': 1, 'low': 2}
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     task_name = models.CharField(max_length=255)
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES)
+    priority_rank = models.PositiveSmallIntegerField(default=1, editable=False)
     estimated_time = models.DurationField() # Stores hours and minutes
     is_completed = models.BooleanField(default=False)
     is_scheduled = models.BooleanField(default=False)
     rescheduled_time = models.DurationField(null=True, blank=True)
+    # Where the scheduler placed the task in its owner's free time, when it was
+    # placed from the timetable rather than a number of free minutes
+    scheduled_day = models.CharField(max_length=3, choices=TimetableEntry.DAY_CHOICES, null=True, blank=True)
+    scheduled_start = models.TimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_scheduled', 'is_completed'], name='task_user_state_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, 1)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.task_name
\ No newline at end of file
@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+# Index of everything booked during a generation run, shared by all streams.
+# Conflict checks and professor load lookups are set/dict hits instead of
+# scans over the lectures placed so far.
+class OccupancyIndex:
+    def __init__(self):
+        self.professor_slots = set()  # (professor_id, day, timeslot_id)
+        self.location_slots = set()  # (location_id, day, timeslot_id)
+        self.stream_slots = set()  # (stream_id, day, timeslot_id)
+        self.professor_load = defaultdict(int)  # professor_id -> lectures this week
+
+    def copy(self):
+        other = OccupancyIndex()
+        other.professor_slots = set(self.professor_slots)
+        other.location_slots = set(self.location_slots)
+        other.stream_slots = set(self.stream_slots)
+        other.professor_load = defaultdict(int, self.professor_load)
+        return other
+
+    def professor_busy(self, professor_id, day, timeslot_id):
+        return (professor_id, day, timeslot_id) in self.professor_slots
+
+    def location_busy(self, location_id, day, timeslot_id):
+        return (location_id, day, timeslot_id) in self.location_slots
+
+    def stream_busy(self, stream_id, day, timeslot_id):
+        return (stream_id, day, timeslot_id) in self.stream_slots
+
+    def professor_lectures(self, professor_id):
+        return self.professor_load[professor_id]
+
+    def book(self, stream_id, day, timeslot_id, professor_id=None, location_id=None):
+        self.stream_slots.add((stream_id, day, timeslot_id))
+        if professor_id is not None:
+            self.professor_slots.add((professor_id, day, timeslot_id))
+            self.professor_load[professor_id] += 1
+        if location_id is not None:
+            self.location_slots.add((location_id, day, timeslot_id))
+
+    def release(self, stream_id, day, timeslot_id, professor_id=None, location_id=None):
+        self.stream_slots.discard((stream_id, day, timeslot_id))
+        if professor_id is not None:
+            self.professor_slots.discard((professor_id, day, timeslot_id))
+            self.professor_load[professor_id] -= 1
+        if location_id is not None:
+            self.location_slots.discard((location_id, day, timeslot_id))
\ No newline at end of file
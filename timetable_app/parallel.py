@@ -0,0 +1,139 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.db import connections
+from .instrumentation import GenerationStats
+from .occupancy import OccupancyIndex
+from .solvers import SolverResult, build_lectures, get_solver
+
+DEFAULT_WORKERS = getattr(settings, 'TIMETABLE_WORKERS', 1)
+
+def resolve_workers(workers=None):
+    # 0 means one worker per CPU
+    workers = DEFAULT_WORKERS if workers is None else workers
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+# Groups streams that share at least one professor, directly or through other
+# streams. Streams in different clusters never compete for a professor.
+def stream_clusters(problem):
+    parent = list(range(len(problem.streams)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_stream_of = {}
+    for stream_index, stream in enumerate(problem.streams):
+        for subject_index in stream.subjects:
+            for professor_index in problem.subjects[subject_index].professors:
+                other = first_stream_of.setdefault(professor_index, stream_index)
+                parent[find(stream_index)] = find(other)
+
+    clusters = {}
+    for stream_index in range(len(problem.streams)):
+        clusters.setdefault(find(stream_index), []).append(stream_index)
+    return list(clusters.values())
+
+# Rooms are not tied to departments, so every cluster could use every room. To make
+# clusters independent, each room type is split between them in proportion to their
+# weekly lecture demand for that type (largest remainder, at least one room each
+# where possible).
+def split_rooms(problem, clusters):
+    demand = [Counter() for _ in clusters]
+    for cluster_index, streams in enumerate(clusters):
+        for lecture in build_lectures(problem, streams):
+            subject = problem.subjects[lecture.subject]
+            if not subject.is_non_academic:
+                demand[cluster_index][subject.room_type] += 1
+
+    pools = [{} for _ in clusters]
+    for room_type, rooms in problem.rooms_by_type.items():
+        wanting = [i for i in range(len(clusters)) if demand[i][room_type]]
+        if not wanting:
+            continue
+        total = sum(demand[i][room_type] for i in wanting)
+        shares = {i: demand[i][room_type] * len(rooms) / total for i in wanting}
+        counts = {i: int(shares[i]) for i in wanting}
+        leftover = len(rooms) - sum(counts.values())
+        # Clusters without a room get one first, then the largest remainders
+        for i in sorted(wanting, key=lambda i: (counts[i] > 0, counts[i] - shares[i])):
+            if leftover <= 0:
+                break
+            counts[i] += 1
+            leftover -= 1
+        position = 0
+        for i in wanting:
+            pools[i][room_type] = rooms[position:position + counts[i]]
+            position += counts[i]
+    return pools
+
+# Returns the result and the run's stats as a plain dict, so it can come back from a worker
+def _solve_cluster(problem, streams, engine, time_limit, seed=None):
+    solver = get_solver(engine, time_limit=time_limit, seed=seed)
+    result = solver.solve(problem, build_lectures(problem, streams))
+    return result, solver.stats.as_dict()
+
+# Solves independent stream clusters in a process pool and merges the results.
+# Lectures a cluster could not place with its share of the rooms get a second,
+# sequential pass against the merged occupancy with every room available.
+def solve_parallel(problem, engine=None, time_limit=None, workers=None, seed=None, stats=None):
+    stats = stats if stats is not None else GenerationStats()
+    workers = resolve_workers(workers)
+    clusters = stream_clusters(problem)
+    if workers <= 1 or len(clusters) <= 1:
+        result, cluster_stats = _solve_cluster(problem, range(len(problem.streams)), engine, time_limit, seed)
+        stats.merge(cluster_stats)
+        return result
+
+    pools = split_rooms(problem, clusters)
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(workers, len(clusters)), initializer=django.setup) as executor:
+        futures = [
+            executor.submit(_solve_cluster, problem._replace(rooms_by_type=pool), streams, engine, time_limit, seed)
+            for streams, pool in zip(clusters, pools)
+        ]
+        results = [future.result() for future in futures]
+
+    occupancy = OccupancyIndex()
+    placements = []
+    unplaced = []
+    for result, cluster_stats in results:
+        stats.merge(cluster_stats)
+        for placement in result.placements:
+            occupancy.book(placement.stream, placement.day, placement.slot, placement.professor, placement.room)
+        placements.extend(result.placements)
+        unplaced.extend(result.unplaced)
+
+    if unplaced:
+        repaired = get_solver(engine, time_limit=time_limit, seed=seed, stats=stats).solve(problem, unplaced, occupancy)
+        placements.extend(repaired.placements)
+        unplaced = repaired.unplaced
+    return SolverResult(placements, unplaced)
+
+# Runs the whole problem once per seed, spread over a process pool, and returns
+# (seed, result) pairs in seed order. stats collects the work of every run.
+def solve_restarts(problem, seeds, engine=None, time_limit=None, workers=None, stats=None):
+    stats = stats if stats is not None else GenerationStats()
+    all_streams = range(len(problem.streams))
+    workers = min(resolve_workers(workers), len(seeds))
+    if workers <= 1:
+        runs = [(seed, _solve_cluster(problem, all_streams, engine, time_limit, seed)) for seed in seeds]
+    else:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            futures = [
+                executor.submit(_solve_cluster, problem, all_streams, engine, time_limit, seed)
+                for seed in seeds
+            ]
+            runs = [(seed, future.result()) for seed, future in zip(seeds, futures)]
+
+    for _, (_, run_stats) in runs:
+        stats.merge(run_stats)
+    return [(seed, result) for seed, (result, _) in runs]
@@ -0,0 +1,81 @@
+import datetime
+from collections import namedtuple
+from .models import Professor, Location, Subject, Stream, TimeSlot
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri')
+
+# Compact, read-only records for the scheduling problem. References between
+# records are integer positions (e.g. Subject.professors holds indexes into
+# Problem.professors), never model instances.
+ProfessorRecord = namedtuple('ProfessorRecord', 'id name weekly_limit working_hours_start working_hours_end')
+SubjectRecord = namedtuple('SubjectRecord', 'id name code lectures_per_week is_non_academic room_type professors')
+StreamRecord = namedtuple('StreamRecord', 'id name department_id number_of_days non_academic_lectures_per_week subjects')
+LocationRecord = namedtuple('LocationRecord', 'id name location_type floor')
+TimeSlotRecord = namedtuple('TimeSlotRecord', 'id start_time end_time is_lunch_break')
+
+# rooms_by_type maps a location_type to the tuple of location indexes of that type
+Problem = namedtuple('Problem', 'professors subjects streams locations timeslots rooms_by_type')
+
+# The slot starting at this time is the lunch break and is never scheduled
+LUNCH_BREAK_START = datetime.time(12, 15)
+
+def _is_lunch_break(start_time):
+    return start_time == LUNCH_BREAK_START
+
+def _room_type(subject_name):
+    return 'lab' if 'lab' in subject_name.lower() else 'classroom'
+
+def _group_links(pairs, owner_index, target_index):
+    # Turn (owner_id, target_id) rows from an M2M through table into index tuples per owner
+    grouped = [[] for _ in owner_index]
+    for owner_id, target_id in pairs:
+        if owner_id in owner_index and target_id in target_index:
+            grouped[owner_index[owner_id]].append(target_index[target_id])
+    return [tuple(sorted(targets)) for targets in grouped]
+
+# Reads the whole problem in a fixed number of queries (one per table and M2M link)
+def load_problem():
+    professor_rows = list(Professor.objects.order_by('id').values_list(
+        'id', 'name', 'total_weekly_lectures', 'working_hours_start', 'working_hours_end'))
+    subject_rows = list(Subject.objects.order_by('id').values_list(
+        'id', 'name', 'code', 'lectures_per_week', 'is_non_academic'))
+    stream_rows = list(Stream.objects.order_by('id').values_list(
+        'id', 'name', 'department_id', 'number_of_days', 'non_academic_lectures_per_week'))
+    location_rows = list(Location.objects.order_by('id').values_list('id', 'name', 'location_type', 'floor'))
+    timeslot_rows = list(TimeSlot.objects.order_by('start_time', 'id').values_list('id', 'start_time', 'end_time'))
+    subject_professor_rows = Subject.professors.through.objects.values_list('subject_id', 'professor_id')
+    stream_subject_rows = Stream.subjects.through.objects.values_list('stream_id', 'subject_id')
+    return build_problem(professor_rows, subject_rows, stream_rows, location_rows, timeslot_rows,
+                         subject_professor_rows, stream_subject_rows)
+
+# Builds the Problem from plain rows, shaped like the values_list() queries of
+# load_problem; timeslot rows must be in time order. Also used for snapshots,
+# which are solved without a database.
+def build_problem(professor_rows, subject_rows, stream_rows, location_rows, timeslot_rows,
+                  subject_professor_rows, stream_subject_rows):
+    professor_index = {row[0]: i for i, row in enumerate(professor_rows)}
+    subject_index = {row[0]: i for i, row in enumerate(subject_rows)}
+    stream_index = {row[0]: i for i, row in enumerate(stream_rows)}
+
+    subject_professors = _group_links(subject_professor_rows, subject_index, professor_index)
+    stream_subjects = _group_links(stream_subject_rows, stream_index, subject_index)
+
+    professors = tuple(ProfessorRecord(*row) for row in professor_rows)
+    subjects = tuple(
+        SubjectRecord(id, name, code, lectures, non_academic, _room_type(name), subject_professors[i])
+        for i, (id, name, code, lectures, non_academic) in enumerate(subject_rows)
+    )
+    streams = tuple(
+        StreamRecord(*row, stream_subjects[i]) for i, row in enumerate(stream_rows)
+    )
+    locations = tuple(LocationRecord(*row) for row in location_rows)
+    timeslots = tuple(
+        TimeSlotRecord(id, start, end, _is_lunch_break(start)) for id, start, end in timeslot_rows
+    )
+
+    rooms_by_type = {}
+    for i, location in enumerate(locations):
+        rooms_by_type.setdefault(location.location_type, []).append(i)
+    rooms_by_type = {key: tuple(value) for key, value in rooms_by_type.items()}
+
+    return Problem(professors, subjects, streams, locations, timeslots, rooms_by_type)
@@ -0,0 +1,95 @@
+import datetime
+from collections import namedtuple
+from django.core.cache import cache
+from .models import Location, TimeSlot
+from .problem import DAYS
+from .versions import CACHE_TIMEOUT, cache_version, live_entries
+
+LOCATION_TYPES = [code for code, _ in Location.LOCATION_CHOICES]
+
+Room = namedtuple('Room', 'id name location_type floor')
+# Which rooms are taken when in one timetable version. slots are the timeslots
+# as (id, start, end) in time order; busy maps a location id to a bitmask with
+# bit day * len(slots) + slot set when the room has a lecture then.
+OccupancyMap = namedtuple('OccupancyMap', 'version slots rooms busy')
+
+# The map of the active version last used by this process
+_latest = None
+
+# Reads the live timetable into an OccupancyMap, in three queries
+def build_occupancy(version):
+    slots = tuple(TimeSlot.objects.order_by('start_time', 'id').values_list('id', 'start_time', 'end_time'))
+    slot_index = {slot_id: i for i, (slot_id, _, _) in enumerate(slots)}
+    day_index = {day: i for i, day in enumerate(DAYS)}
+    rooms = tuple(Room(*row) for row in Location.objects.order_by('name', 'id').values_list('id', 'name', 'location_type', 'floor'))
+    busy = {room.id: 0 for room in rooms}
+    rows = live_entries().exclude(location=None).exclude(timeslot=None).values_list('location_id', 'day_of_week', 'timeslot_id').order_by()
+    for location_id, day, timeslot_id in rows:
+        if day in day_index and timeslot_id in slot_index:
+            busy[location_id] = busy.get(location_id, 0) | 1 << (day_index[day] * len(slots) + slot_index[timeslot_id])
+    return OccupancyMap(version, slots, rooms, busy)
+
+# The occupancy map of the active timetable. It is built once per cache version
+# (a new timetable or a data edit) and shared through the cache; each process
+# also keeps the last one it used, so a search costs only the version lookup.
+# Without an active timetable every room is free and nothing is kept.
+def occupancy_map():
+    global _latest
+    version = cache_version()
+    if version == 'none':
+        return build_occupancy(version)
+    if _latest is not None and _latest.version == version:
+        return _latest
+    occupancy = cache.get('room-occupancy', version=version)
+    if occupancy is None:
+        occupancy = build_occupancy(version)
+        cache.set('room-occupancy', occupancy, CACHE_TIMEOUT, version=version)
+    _latest = occupancy
+    return occupancy
+
+# Rooms free on `day` for `count` consecutive slots from slot number `first`,
+# optionally only of one type or on one floor. A single mask test per room.
+def free_rooms(occupancy, day, first, count=1, location_type=None, floor=None):
+    mask = ((1 << count) - 1) << (DAYS.index(day) * len(occupancy.slots) + first)
+    return [
+        room for room in occupancy.rooms
+        if not occupancy.busy[room.id] & mask
+        and (location_type is None or room.location_type == location_type)
+        and (floor is None or room.floor == floor)
+    ]
+
+def _slot_at(occupancy, value):
+    try:
+        time = datetime.datetime.strptime(value, '%H:%M').time()
+    except ValueError:
+        raise ValueError("'start' must be a time as HH:MM.")
+    for i, (_, start, end) in enumerate(occupancy.slots):
+        if start <= time < end:
+            return i
+    raise ValueError(f"No timeslot runs at {value}.")
+
+# Validated search parameters (day, start, slots, type, floor) as keyword
+# arguments for free_rooms; raises ValueError with a message for the client
+# when one is malformed
+def parse_free_room_query(params, occupancy):
+    day = params.get('day', '').lower()
+    if day not in DAYS:
+        raise ValueError(f"'day' must be one of {', '.join(DAYS)}.")
+    first = _slot_at(occupancy, params.get('start', ''))
+    try:
+        count = int(params.get('slots') or 1)
+    except ValueError:
+        count = 0
+    if count < 1 or first + count > len(occupancy.slots):
+        raise ValueError(f"'slots' must be between 1 and {len(occupancy.slots) - first} from that start.")
+    query = {'day': day, 'first': first, 'count': count, 'location_type': None, 'floor': None}
+    if params.get('type'):
+        if params['type'] not in LOCATION_TYPES:
+            raise ValueError(f"'type' must be one of {', '.join(LOCATION_TYPES)}.")
+        query['location_type'] = params['type']
+    if params.get('floor'):
+        try:
+            query['floor'] = int(params['floor'])
+        except ValueError:
+            raise ValueError("'floor' must be an integer.")
+    return query
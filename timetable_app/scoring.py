@@ -0,0 +1,41 @@
+from collections import Counter, defaultdict, namedtuple
+from .solvers import stream_days
+
+# Penalties of a solver result; lower is better. Unplaced lectures dominate, then
+# a subject taught more than once a day to the same stream, idle slots between a
+# stream's lectures, and days that are much busier than others.
+Score = namedtuple('Score', 'total unplaced repeats gaps imbalance')
+
+UNPLACED_WEIGHT = 1000
+REPEAT_WEIGHT = 3
+GAP_WEIGHT = 1
+IMBALANCE_WEIGHT = 1
+
+def score_result(problem, result):
+    same_day = Counter()
+    stream_day_slots = defaultdict(list)
+    for placement in result.placements:
+        if placement.professor is not None:
+            same_day[placement.stream, placement.subject, placement.day] += 1
+        stream_day_slots[placement.stream, placement.day].append(placement.slot)
+
+    repeats = sum(count - 1 for count in same_day.values())
+
+    # Lunch break slots are never placed and never count as a gap
+    lunch = [i for i, timeslot in enumerate(problem.timeslots) if timeslot.is_lunch_break]
+    gaps = 0
+    per_day = defaultdict(dict)
+    for (stream, day), slots in stream_day_slots.items():
+        first, last = min(slots), max(slots)
+        gaps += last - first + 1 - len(slots) - sum(1 for i in lunch if first < i < last)
+        per_day[stream][day] = len(slots)
+
+    imbalance = 0
+    for stream, days in per_day.items():
+        counts = [days.get(day, 0) for day in stream_days(problem.streams[stream])]
+        imbalance += max(counts) - min(counts)
+
+    unplaced = len(result.unplaced)
+    total = (UNPLACED_WEIGHT * unplaced + REPEAT_WEIGHT * repeats
+             + GAP_WEIGHT * gaps + IMBALANCE_WEIGHT * imbalance)
+    return Score(total, unplaced, repeats, gaps, imbalance)
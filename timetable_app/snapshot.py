@@ -0,0 +1,192 @@
+import datetime
+import gzip
+import json
+from collections import namedtuple
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import (CustomUser, Department, Location, Professor, Stream, Subject, TimeSlot, TimetableEntry,
+                     TimetableVersion)
+from .problem import DAYS, build_problem
+from .synthetic import clear_dataset
+from .timetable_generator import DEFAULT_BATCH_SIZE
+from .utilization import summarize_version
+from .versions import active_version
+
+SNAPSHOT_FORMAT = 'timetable-snapshot'
+# Bumped whenever the layout below changes; files of another version are refused
+SNAPSHOT_VERSION = 1
+
+# Tables in restore order: (name, model, columns). The first column is the sort
+# key of the table and is stored as differences from the previous row, so the
+# mostly consecutive ids compress to runs of small numbers.
+SNAPSHOT_TABLES = (
+    ('departments', Department, ('id', 'name')),
+    ('professors', Professor, ('id', 'name', 'email', 'working_hours_start', 'working_hours_end', 'total_weekly_lectures')),
+    ('professor_departments', Professor.departments.through, ('professor_id', 'department_id')),
+    ('locations', Location, ('id', 'name', 'location_type', 'floor')),
+    ('subjects', Subject, ('id', 'name', 'code', 'lectures_per_week', 'lecture_duration_minutes', 'is_non_academic')),
+    ('subject_professors', Subject.professors.through, ('subject_id', 'professor_id')),
+    ('streams', Stream, ('id', 'name', 'department_id', 'division', 'semester', 'academic_year', 'number_of_days',
+                         'non_academic_lectures_per_week', 'coordinator_id')),
+    ('stream_subjects', Stream.subjects.through, ('stream_id', 'subject_id')),
+    ('timeslots', TimeSlot, ('id', 'start_time', 'end_time')),
+)
+# The active timetable; day is an index into DAYS
+ENTRY_COLUMNS = ('stream_id', 'subject_id', 'professor_id', 'location_id', 'day', 'timeslot_id')
+
+# Stored as minutes after midnight
+TIME_COLUMNS = {'working_hours_start', 'working_hours_end', 'start_time', 'end_time'}
+
+# A loaded snapshot: tables maps a table name to its rows (tuples in the column
+# order of SNAPSHOT_TABLES, times as datetime.time); timetable is None or
+# (kind, entry rows with the day as 'mon'..'fri')
+Snapshot = namedtuple('Snapshot', 'created_at tables timetable')
+
+def _minutes(value):
+    return None if value is None else value.hour * 60 + value.minute
+
+def _time(minutes):
+    return None if minutes is None else datetime.time(minutes // 60, minutes % 60)
+
+def _encode(columns, rows):
+    data = [list(values) for values in zip(*rows)] or [[] for _ in columns]
+    for i, name in enumerate(columns):
+        if name in TIME_COLUMNS:
+            data[i] = [_minutes(value) for value in data[i]]
+    data[0] = [value - previous for value, previous in zip(data[0], [0] + data[0])]
+    return {'columns': list(columns), 'data': data}
+
+def _decode(name, table, columns):
+    try:
+        data = [table['data'][table['columns'].index(column)] for column in columns]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Table '{name}' must have the columns {', '.join(columns)}.")
+    if len({len(values) for values in data}) > 1:
+        raise ValueError(f"Table '{name}' has columns of different lengths.")
+    total = 0
+    for i, delta in enumerate(data[0]):
+        total += delta
+        data[0][i] = total
+    for i, column in enumerate(columns):
+        if column in TIME_COLUMNS:
+            data[i] = [_time(value) for value in data[i]]
+    return list(zip(*data))
+
+# Writes every scheduling input and the active timetable to a gzip-compressed
+# JSON file of columnar tables. Returns the number of rows per table.
+def write_snapshot(path):
+    tables = {}
+    with transaction.atomic():
+        for name, model, columns in SNAPSHOT_TABLES:
+            tables[name] = _encode(columns, model.objects.order_by(*columns[:2]).values_list(*columns))
+        version = active_version()
+        timetable = None
+        if version is not None:
+            rows = (TimetableEntry.objects.filter(version=version).order_by('stream_id', 'id')
+                    .values_list('stream_id', 'subject_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'))
+            timetable = {
+                'kind': version.kind,
+                'entries': _encode(ENTRY_COLUMNS, [row[:4] + (DAYS.index(row[4]),) + row[5:] for row in rows]),
+            }
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'tables': tables,
+        'timetable': timetable,
+    }
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        json.dump(snapshot, file, separators=(',', ':'))
+    counts = {name: len(table['data'][0]) for name, table in tables.items()}
+    counts['entries'] = len(timetable['entries']['data'][0]) if timetable else 0
+    return counts
+
+# Reads and checks a snapshot file; raises ValueError when it is not one this
+# build can read. Needs no database.
+def read_snapshot(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            snapshot = json.load(file)
+    except (gzip.BadGzipFile, EOFError, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f'{path} is not a timetable snapshot.')
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f'{path} is not a timetable snapshot.')
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is a version {snapshot.get('version')} snapshot; only version {SNAPSHOT_VERSION} can be read.")
+
+    tables = {}
+    for name, _, columns in SNAPSHOT_TABLES:
+        if name not in snapshot.get('tables', {}):
+            raise ValueError(f"The snapshot has no '{name}' table.")
+        tables[name] = _decode(name, snapshot['tables'][name], columns)
+    timetable = None
+    if snapshot.get('timetable'):
+        rows = _decode('entries', snapshot['timetable'].get('entries'), ENTRY_COLUMNS)
+        if any(row[4] not in range(len(DAYS)) for row in rows):
+            raise ValueError('The snapshot timetable has an unknown day.')
+        timetable = (snapshot['timetable'].get('kind', 'full'), [row[:4] + (DAYS[row[4]],) + row[5:] for row in rows])
+    return Snapshot(snapshot.get('created_at'), tables, timetable)
+
+def _columns(snapshot, name, *wanted):
+    columns = next(columns for table, _, columns in SNAPSHOT_TABLES if table == name)
+    picks = [columns.index(column) for column in wanted]
+    return [tuple(row[i] for i in picks) for row in snapshot.tables[name]]
+
+# The scheduling problem stored in a snapshot, built without the database so
+# the generator can solve it offline
+def snapshot_problem(snapshot):
+    return build_problem(
+        _columns(snapshot, 'professors', 'id', 'name', 'total_weekly_lectures', 'working_hours_start', 'working_hours_end'),
+        _columns(snapshot, 'subjects', 'id', 'name', 'code', 'lectures_per_week', 'is_non_academic'),
+        _columns(snapshot, 'streams', 'id', 'name', 'department_id', 'number_of_days', 'non_academic_lectures_per_week'),
+        _columns(snapshot, 'locations', 'id', 'name', 'location_type', 'floor'),
+        sorted(_columns(snapshot, 'timeslots', 'id', 'start_time', 'end_time'), key=lambda row: (row[1], row[0])),
+        _columns(snapshot, 'subject_professors', 'subject_id', 'professor_id'),
+        _columns(snapshot, 'stream_subjects', 'stream_id', 'subject_id'),
+    )
+
+# Replaces all scheduling data and timetables with the snapshot's, keeping its
+# ids, in one transaction of bulk inserts. The snapshot's timetable becomes the
+# active version. Students keep their stream when it is in the snapshot.
+# Returns the number of rows restored per table.
+@transaction.atomic
+def restore_snapshot(snapshot, batch_size=None):
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    students = list(CustomUser.objects.exclude(stream=None).values_list('id', 'stream_id'))
+    # Revisions never go back (they are the SEQUENCE of calendar feed events)
+    revision = TimetableVersion.objects.aggregate(revision=Max('revision'))['revision']
+    clear_dataset()
+
+    counts = {}
+    for name, model, columns in SNAPSHOT_TABLES:
+        rows = snapshot.tables[name]
+        model.objects.bulk_create((model(**dict(zip(columns, row))) for row in rows), batch_size=batch_size)
+        counts[name] = len(rows)
+
+    counts['entries'] = 0
+    if snapshot.timetable is not None:
+        kind, rows = snapshot.timetable
+        version = TimetableVersion.objects.create(kind=kind, status='active', activated_at=timezone.now(),
+                                                 revision=0 if revision is None else revision + 1)
+        TimetableEntry.objects.bulk_create(
+            (TimetableEntry(version_id=version.pk, stream_id=stream_id, subject_id=subject_id, professor_id=professor_id,
+                            location_id=location_id, day_of_week=day, timeslot_id=timeslot_id)
+             for stream_id, subject_id, professor_id, location_id, day, timeslot_id in rows),
+            batch_size=batch_size,
+        )
+        summarize_version(version)
+        counts['entries'] = len(rows)
+
+    # Rows were inserted with explicit ids, so the next generated ones must start after them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model for _, model, _ in SNAPSHOT_TABLES]):
+            cursor.execute(sql)
+
+    stream_ids = {row[0] for row in snapshot.tables['streams']}
+    CustomUser.objects.bulk_update(
+        [CustomUser(id=user_id, stream_id=stream_id) for user_id, stream_id in students if stream_id in stream_ids],
+        ['stream'], batch_size=batch_size,
+    )
+    return counts
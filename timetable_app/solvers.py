@@ -0,0 +1,533 @@
+import heapq
+import random
+import time
+from collections import Counter, namedtuple
+from django.conf import settings
+from .instrumentation import GenerationStats
+from .occupancy import OccupancyIndex
+from .problem import DAYS
+
+# A single lecture that has to be placed: indexes into Problem.streams / Problem.subjects
+Lecture = namedtuple('Lecture', 'stream subject')
+# Where a lecture ended up. professor and room are None for non-academic lectures.
+Placement = namedtuple('Placement', 'stream subject day slot professor room')
+SolverResult = namedtuple('SolverResult', 'placements unplaced')
+
+DEFAULT_TIME_LIMIT = getattr(settings, 'TIMETABLE_SOLVER_TIME_LIMIT', 60)
+
+# Lectures of the given streams in scheduling order: every academic lecture of a
+# stream first, then the stream's non-academic lectures.
+def build_lectures(problem, stream_indexes=None):
+    if stream_indexes is None:
+        stream_indexes = range(len(problem.streams))
+    lectures = []
+    for stream_index in stream_indexes:
+        stream = problem.streams[stream_index]
+        subjects = [(i, problem.subjects[i]) for i in stream.subjects]
+        for subject_index, subject in subjects:
+            if not subject.is_non_academic:
+                lectures.extend([Lecture(stream_index, subject_index)] * subject.lectures_per_week)
+        for subject_index, subject in subjects:
+            if subject.is_non_academic:
+                lectures.extend([Lecture(stream_index, subject_index)] * stream.non_academic_lectures_per_week)
+    return lectures
+
+def usable_slots(problem):
+    return [i for i, timeslot in enumerate(problem.timeslots) if not timeslot.is_lunch_break]
+
+def stream_days(stream):
+    return range(min(stream.number_of_days, len(DAYS)))
+
+# Base class for scheduling engines. solve() places lectures into the given
+# occupancy (a fresh one when omitted) and returns a SolverResult. A seed turns on
+# randomized choices; the same seed always makes the same choices. progress, when
+# given, is called now and then as progress(placed, total). Timings and counters
+# go to stats (see instrumentation.GenerationStats).
+class Solver:
+    name = None
+
+    def __init__(self, time_limit=None, seed=None, progress=None, stats=None):
+        self.time_limit = DEFAULT_TIME_LIMIT if time_limit is None else time_limit
+        self.seed = seed
+        self.progress = progress
+        self.stats = stats if stats is not None else GenerationStats()
+
+    def report_progress(self, placed, total):
+        if self.progress is not None:
+            self.progress(placed, total)
+
+    def solve(self, problem, lectures, occupancy=None):
+        raise NotImplementedError
+
+# First-fit: every lecture takes the earliest free day/slot, the first available
+# professor and the first free room of the right type. Fast, but never revisits
+# an earlier decision. With a seed, streams are taken in a shuffled order and each
+# lecture tries days/slots, professors and rooms in a random order instead.
+# Non-academic lectures only need a free slot of their own stream, so they are
+# filled in after every academic lecture has been placed.
+class GreedySolver(Solver):
+    name = 'greedy'
+
+    def solve(self, problem, lectures, occupancy=None):
+        occupancy = occupancy if occupancy is not None else OccupancyIndex()
+        rng = random.Random(self.seed) if self.seed is not None else None
+        slots = usable_slots(problem)
+        placements = []
+        unplaced = []
+
+        if rng:
+            lectures = self._shuffle_streams(lectures, rng)
+        academic = [l for l in lectures if not problem.subjects[l.subject].is_non_academic]
+        non_academic = [l for l in lectures if problem.subjects[l.subject].is_non_academic]
+
+        for phase, phase_lectures in (('placement', academic), ('non_academic', non_academic)):
+            with self.stats.phase(phase):
+                for position, lecture in enumerate(phase_lectures):
+                    if position % 100 == 0:
+                        self.report_progress(len(placements), len(lectures))
+                    stream = problem.streams[lecture.stream]
+                    subject = problem.subjects[lecture.subject]
+                    cells = [(day, slot) for day in stream_days(stream) for slot in slots]
+                    if rng:
+                        rng.shuffle(cells)
+                    if subject.is_non_academic:
+                        placement = self._place_non_academic(lecture, cells, occupancy)
+                    else:
+                        placement = self._place_academic(problem, lecture, subject, cells, occupancy, rng)
+
+                    if placement is None:
+                        unplaced.append(lecture)
+                        continue
+                    occupancy.book(placement.stream, placement.day, placement.slot, placement.professor, placement.room)
+                    placements.append(placement)
+
+        self.report_progress(len(placements), len(lectures))
+        return SolverResult(placements, unplaced)
+
+    def _shuffle_streams(self, lectures, rng):
+        # Keeps each stream's lectures together and in order (academic first)
+        by_stream = {}
+        for lecture in lectures:
+            by_stream.setdefault(lecture.stream, []).append(lecture)
+        blocks = list(by_stream.values())
+        rng.shuffle(blocks)
+        return [lecture for block in blocks for lecture in block]
+
+    def _place_academic(self, problem, lecture, subject, cells, occupancy, rng):
+        rooms = problem.rooms_by_type.get(subject.room_type, ())
+        professors = list(subject.professors)
+        if rng:
+            rng.shuffle(professors)
+            # Rotate rather than shuffle the rooms; there can be hundreds of them
+            start = rng.randrange(len(rooms)) if rooms else 0
+            rooms = rooms[start:] + rooms[:start]
+        candidates = conflicts = 0
+        placement = None
+        for day, slot in cells:
+            if occupancy.stream_busy(lecture.stream, day, slot):
+                conflicts += 1
+                continue
+            for professor_index in professors:
+                candidates += 1
+                # Check for professor's weekly lecture limit
+                if occupancy.professor_lectures(professor_index) >= problem.professors[professor_index].weekly_limit:
+                    conflicts += 1
+                    continue
+                if occupancy.professor_busy(professor_index, day, slot):
+                    conflicts += 1
+                    continue
+                room = next((r for r in rooms if not occupancy.location_busy(r, day, slot)), None)
+                if room is None:
+                    conflicts += 1
+                    continue
+                placement = Placement(lecture.stream, lecture.subject, day, slot, professor_index, room)
+                break
+            if placement:
+                break
+        self.stats.count('candidates', candidates)
+        self.stats.count('conflicts', conflicts)
+        return placement
+
+    def _place_non_academic(self, lecture, cells, occupancy):
+        conflicts = 0
+        placement = None
+        for day, slot in cells:
+            if occupancy.stream_busy(lecture.stream, day, slot):
+                conflicts += 1
+                continue
+            placement = Placement(lecture.stream, lecture.subject, day, slot, None, None)
+            break
+        self.stats.count('candidates', conflicts + (placement is not None))
+        self.stats.count('conflicts', conflicts)
+        return placement
+
+# Depth-first search over (day, slot, professor) values with most-constrained-first
+# variable ordering and forward checking. Rooms of one type are interchangeable, so
+# a value only needs *some* free room of the subject's type; the concrete room is
+# picked on assignment. The search restarts with a growing node limit and shuffled
+# tie-breaks to get away from bad early decisions (a seed shuffles tie-breaks from
+# the first dive on). If no complete timetable is
+# found within the time budget, the deepest partial assignment is completed
+# greedily, and plain first-fit is used instead if that places more lectures.
+class BacktrackingSolver(Solver):
+    name = 'backtracking'
+
+    def solve(self, problem, lectures, occupancy=None):
+        occupancy = occupancy if occupancy is not None else OccupancyIndex()
+        baseline = occupancy.copy()
+        rng = random.Random(0 if self.seed is None else self.seed)
+        with self.stats.phase('placement'):
+            search = _Search(problem, lectures, occupancy, self.time_limit, rng, self.report_progress)
+            result = search.run(shuffle=self.seed is not None)
+        self.stats.count('candidates', search.candidates)
+        self.stats.count('conflicts', search.conflicts)
+        self.stats.count('backtracks', search.backtracks)
+        self.stats.count('restarts', search.restarts)
+        if not result.unplaced:
+            self.report_progress(len(result.placements), len(lectures))
+            return result
+
+        completed = GreedySolver(seed=self.seed, stats=self.stats).solve(problem, result.unplaced, occupancy)
+        result = SolverResult(result.placements + completed.placements, completed.unplaced)
+        greedy = GreedySolver(seed=self.seed, stats=self.stats).solve(problem, lectures, baseline)
+        if len(greedy.unplaced) >= len(result.unplaced):
+            self.report_progress(len(result.placements), len(lectures))
+            return result
+
+        for placement in result.placements:
+            occupancy.release(placement.stream, placement.day, placement.slot, placement.professor, placement.room)
+        for placement in greedy.placements:
+            occupancy.book(placement.stream, placement.day, placement.slot, placement.professor, placement.room)
+        self.report_progress(len(greedy.placements), len(lectures))
+        return greedy
+
+class _Search:
+    def __init__(self, problem, lectures, occupancy, time_limit, rng, report_progress):
+        self.problem = problem
+        self.lectures = lectures
+        self.occupancy = occupancy
+        self.deadline = time.monotonic() + time_limit
+        self.rng = rng
+        self.report_progress = report_progress
+        self.deepest = 0
+        self.candidates = self.conflicts = self.backtracks = self.restarts = 0
+        slots = usable_slots(problem)
+
+        subjects = [problem.subjects[lecture.subject] for lecture in lectures]
+        # Professor choices per variable; (None,) for non-academic lectures
+        self.choices = [s.professors if not s.is_non_academic else (None,) for s in subjects]
+        self.room_types = [None if s.is_non_academic else s.room_type for s in subjects]
+        # The professor a lecture must be taught by, when its subject has only one
+        self.forced = [c[0] if len(c) == 1 else None for c in self.choices]
+        self.limits = [professor.weekly_limit for professor in problem.professors]
+
+        # Free rooms per (room type, day, slot), after anything already in the occupancy
+        self.free_rooms = {}
+        for room_type, rooms in problem.rooms_by_type.items():
+            for day in range(len(DAYS)):
+                for slot in slots:
+                    self.free_rooms[room_type, day, slot] = sum(
+                        1 for r in rooms if not occupancy.location_busy(r, day, slot))
+
+        self.by_stream = {}
+        self.by_professor = {}
+        self.by_room_type = {}
+        self.domains = []
+        for var, lecture in enumerate(lectures):
+            days = stream_days(problem.streams[lecture.stream])
+            self.domains.append({
+                (day, slot, professor_index)
+                for day in days for slot in slots for professor_index in self.choices[var]
+                if self._allowed(var, lecture.stream, day, slot, professor_index)
+            })
+            # Lectures with no possible value at all are reported as unplaced
+            # instead of failing the whole search, and take no part in it
+            if not self.domains[var]:
+                continue
+            self.by_stream.setdefault(lecture.stream, []).append(var)
+            for professor_index in self.choices[var]:
+                if professor_index is not None:
+                    self.by_professor.setdefault(professor_index, []).append(var)
+            if self.room_types[var] is not None:
+                self.by_room_type.setdefault(self.room_types[var], []).append(var)
+        self.variables = [var for var, domain in enumerate(self.domains) if domain]
+
+        # Lectures still waiting for their only professor. When a professor's weekly
+        # limit minus their load leaves exactly this many lectures, nobody else's
+        # lecture may go to them. Professors that are overbooked from the start are
+        # left to the plain weekly-limit check.
+        self.must_teach = Counter(self.forced[var] for var in self.variables if self.forced[var] is not None)
+        self.overbooked = {p for p in self.must_teach if self._spare(p) < 0}
+
+        self.assigned = [None] * len(lectures)
+        self.trail = []
+        self.tiebreak = [0] * len(lectures)
+        # Failure counts per variable (dom/wdeg): lectures that keep running out of
+        # values get picked earlier, within this dive and after a restart
+        self.weight = [1] * len(lectures)
+        self._rebuild_heap()
+
+    def _allowed(self, var, stream_index, day, slot, professor_index):
+        occupancy = self.occupancy
+        if occupancy.stream_busy(stream_index, day, slot):
+            return False
+        if professor_index is not None:
+            if occupancy.professor_busy(professor_index, day, slot):
+                return False
+            if occupancy.professor_lectures(professor_index) >= self.limits[professor_index]:
+                return False
+        room_type = self.room_types[var]
+        if room_type is not None and self.free_rooms.get((room_type, day, slot), 0) <= 0:
+            return False
+        return True
+
+    def _spare(self, professor_index):
+        return (self.limits[professor_index] - self.occupancy.professor_lectures(professor_index)
+                - self.must_teach[professor_index])
+
+    def _priority(self, var):
+        return len(self.domains[var]) / self.weight[var]
+
+    def _push(self, var):
+        # Non-academic lectures sort after academic ones of the same priority
+        heapq.heappush(self.heap, (self._priority(var), self.room_types[var] is None, self.tiebreak[var], var))
+
+    def _rebuild_heap(self):
+        self.heap = []
+        for var in self.variables:
+            if self.assigned[var] is None:
+                self._push(var)
+
+    def _select(self):
+        while self.heap:
+            priority, _, _, var = self.heap[0]
+            if self.assigned[var] is not None or priority != self._priority(var):
+                heapq.heappop(self.heap)
+                continue
+            return var
+        return None
+
+    def _prune(self, var, value, touched):
+        domain = self.domains[var]
+        if value in domain:
+            domain.discard(value)
+            self.trail.append((var, value))
+            touched.add(var)
+
+    def _prune_cell(self, var, day, slot, touched):
+        for choice in self.choices[var]:
+            self._prune(var, (day, slot, choice), touched)
+
+    def _prune_professor(self, var, professor_index, touched):
+        for value in [v for v in self.domains[var] if v[2] == professor_index]:
+            self._prune(var, value, touched)
+
+    def _assign(self, var, value):
+        day, slot, professor_index = value
+        lecture = self.lectures[var]
+        room_type = self.room_types[var]
+        room = None
+        if room_type is not None:
+            room = next(r for r in self.problem.rooms_by_type[room_type]
+                        if not self.occupancy.location_busy(r, day, slot))
+            self.free_rooms[room_type, day, slot] -= 1
+        if self.forced[var] is not None:
+            self.must_teach[professor_index] -= 1
+        self.occupancy.book(lecture.stream, day, slot, professor_index, room)
+        self.assigned[var] = (day, slot, professor_index, room)
+
+        # Forward checking: drop values that this assignment has made impossible
+        touched = set()
+        for other in self.by_stream[lecture.stream]:
+            if self.assigned[other] is None:
+                self._prune_cell(other, day, slot, touched)
+
+        if professor_index is not None:
+            load = self.occupancy.professor_lectures(professor_index)
+            spare = self._spare(professor_index)
+            if professor_index not in self.overbooked and spare < 0:
+                self._blame(v for v in self.by_professor[professor_index] if self.assigned[v] is None)
+                return False
+            for other in self.by_professor[professor_index]:
+                if self.assigned[other] is not None:
+                    continue
+                if load >= self.limits[professor_index]:
+                    self._prune_professor(other, professor_index, touched)
+                elif spare == 0 and professor_index not in self.overbooked and self.forced[other] is None:
+                    self._prune_professor(other, professor_index, touched)
+                else:
+                    self._prune(other, (day, slot, professor_index), touched)
+
+        if room_type is not None and self.free_rooms[room_type, day, slot] == 0:
+            for other in self.by_room_type[room_type]:
+                if self.assigned[other] is None:
+                    self._prune_cell(other, day, slot, touched)
+
+        wiped = [other for other in touched if not self.domains[other]]
+        if wiped:
+            self._blame(wiped)
+            return False
+        for other in touched:
+            self._push(other)
+
+        # The stream's remaining lectures each need a different day/slot
+        remaining = 0
+        open_cells = set()
+        for other in self.by_stream[lecture.stream]:
+            if self.assigned[other] is None:
+                remaining += 1
+                open_cells.update((v[0], v[1]) for v in self.domains[other])
+        if len(open_cells) < remaining:
+            self._blame(v for v in self.by_stream[lecture.stream] if self.assigned[v] is None)
+            return False
+        return True
+
+    def _blame(self, variables):
+        for var in variables:
+            self.weight[var] += 1
+            self._push(var)
+
+    def _unassign(self, var, mark):
+        while len(self.trail) > mark:
+            other, value = self.trail.pop()
+            self.domains[other].add(value)
+            self._push(other)
+        day, slot, professor_index, room = self.assigned[var]
+        if room is not None:
+            self.free_rooms[self.room_types[var], day, slot] += 1
+        if self.forced[var] is not None:
+            self.must_teach[professor_index] += 1
+        self.occupancy.release(self.lectures[var].stream, day, slot, professor_index, room)
+        self.assigned[var] = None
+        self._push(var)
+        self.backtracks += 1
+
+    def _ordered_values(self, var, jitter):
+        # Least constraining first: prefer day/slots that the stream's other lectures
+        # want least, with the most free rooms, taught by the professor with the
+        # most spare capacity
+        stream = self.lectures[var].stream
+        contention = Counter()
+        for other in self.by_stream[stream]:
+            if other != var and self.assigned[other] is None:
+                contention.update({(v[0], v[1]) for v in self.domains[other]})
+        room_type = self.room_types[var]
+
+        def key(value):
+            day, slot, professor_index = value
+            return (
+                contention[day, slot],
+                -self.free_rooms[room_type, day, slot] if room_type is not None else 0,
+                -self._spare(professor_index) if professor_index is not None else 0,
+                self.rng.random() if jitter else 0,
+                day, slot,
+            )
+        return sorted(self.domains[var], key=key)
+
+    def _snapshot(self):
+        return [(var, value) for var, value in enumerate(self.assigned) if value is not None]
+
+    def _result(self, assignment):
+        placed = set()
+        placements = []
+        for var, (day, slot, professor_index, room) in assignment:
+            lecture = self.lectures[var]
+            placed.add(var)
+            placements.append(Placement(lecture.stream, lecture.subject, day, slot, professor_index, room))
+        unplaced = [lecture for var, lecture in enumerate(self.lectures) if var not in placed]
+        return SolverResult(placements, unplaced)
+
+    def _dive(self, node_limit, jitter):
+        # Returns ('complete' | 'restart' | 'timeout' | 'exhausted', deepest assignment).
+        # Anything but a complete dive is unwound before returning.
+        best = []
+        nodes = 0
+        outcome = 'exhausted'
+        # Each frame: [variable, candidate values, next candidate position, trail mark]
+        stack = []
+        var = self._select()
+        if var is None:
+            return 'complete', self._snapshot()
+        stack.append([var, self._ordered_values(var, jitter), 0, None])
+
+        while stack:
+            if nodes >= node_limit:
+                outcome = 'restart'
+                break
+            if nodes % 64 == 0:
+                if time.monotonic() > self.deadline:
+                    outcome = 'timeout'
+                    break
+                # Progress is the deepest partial timetable reached so far
+                self.deepest = max(self.deepest, len(stack))
+                self.report_progress(self.deepest, len(self.lectures))
+            frame = stack[-1]
+            var, values, position, mark = frame
+            if mark is not None:
+                # Coming back to this frame: remember the deepest assignment
+                # seen so far, then undo this frame's previous value
+                if len(stack) > len(best):
+                    best = self._snapshot()
+                self._unassign(var, mark)
+                frame[3] = None
+            if position >= len(values):
+                stack.pop()
+                continue
+
+            nodes += 1
+            self.candidates += 1
+            frame[2] = position + 1
+            frame[3] = len(self.trail)
+            if not self._assign(var, values[position]):
+                self.conflicts += 1
+                continue
+
+            next_var = self._select()
+            if next_var is None:
+                return 'complete', self._snapshot()
+            stack.append([next_var, self._ordered_values(next_var, jitter), 0, None])
+
+        if sum(1 for frame in stack if frame[3] is not None) > len(best):
+            best = self._snapshot()
+        for var, _, _, mark in reversed(stack):
+            if mark is not None:
+                self._unassign(var, mark)
+        return outcome, best
+
+    def run(self, shuffle=False):
+        best = []
+        node_limit = 2 * len(self.variables) + 100
+        jitter = shuffle
+        if shuffle:
+            self.tiebreak = [self.rng.random() for _ in self.lectures]
+            self._rebuild_heap()
+        while True:
+            outcome, assignment = self._dive(node_limit, jitter)
+            if outcome == 'complete':
+                return self._result(assignment)
+            if len(assignment) > len(best):
+                best = assignment
+            if outcome != 'restart':
+                break
+            # Restart with shuffled tie-breaks and a larger node limit
+            node_limit = int(node_limit * 1.5)
+            jitter = True
+            self.restarts += 1
+            self.tiebreak = [self.rng.random() for _ in self.lectures]
+            self._rebuild_heap()
+
+        # Leave the occupancy holding the best partial assignment
+        for var, (day, slot, professor_index, room) in best:
+            self.occupancy.book(self.lectures[var].stream, day, slot, professor_index, room)
+        return self._result(best)
+
+SOLVERS = {
+    GreedySolver.name: GreedySolver,
+    BacktrackingSolver.name: BacktrackingSolver,
+}
+
+def get_solver(name=None, **options):
+    solver_class = SOLVERS.get(name or 'greedy')
+    if solver_class is None:
+        raise ValueError(f"Unknown solver engine '{name}'. Choose from: {', '.join(SOLVERS)}.")
+    return solver_class(**options)
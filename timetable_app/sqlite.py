@@ -0,0 +1,12 @@
+from django.conf import settings
+
+# Runs the SQLITE_PRAGMAS setting on every new SQLite connection (connected to
+# connection_created in apps.py). Values are written into the statement as is,
+# e.g. {'journal_mode': 'WAL', 'busy_timeout': 20000}.
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,152 @@
+import datetime
+import random
+from django.db import transaction
+from .models import Department, Professor, Location, Subject, Stream, TimeSlot, TimetableEntry, TimetableVersion
+from .problem import LUNCH_BREAK_START
+
+# Named dataset sizes for the benchmark; any of them can be overridden per run
+SIZES = {
+    'tiny': dict(departments=1, streams=4, professors=8, subjects=5, rooms=4, labs=1, timeslots=6),
+    'small': dict(departments=2, streams=12, professors=24, subjects=5, rooms=10, labs=3, timeslots=6),
+    'medium': dict(departments=4, streams=40, professors=80, subjects=6, rooms=32, labs=8, timeslots=7),
+    'large': dict(departments=8, streams=120, professors=240, subjects=6, rooms=96, labs=24, timeslots=8),
+    'huge': dict(departments=16, streams=400, professors=800, subjects=7, rooms=320, labs=80, timeslots=8),
+}
+
+DAYS_PER_WEEK = 5
+FIRST_SLOT = datetime.time(9, 0)
+LUNCH_END = datetime.time(13, 0)
+
+def clear_dataset():
+    TimetableEntry.objects.all().delete()
+    TimetableVersion.objects.all().delete()
+    Stream.objects.all().delete()
+    Subject.objects.all().delete()
+    Professor.objects.all().delete()
+    Location.objects.all().delete()
+    TimeSlot.objects.all().delete()
+    Department.objects.all().delete()
+
+def _timeslots(count):
+    # count one-hour teaching slots from 09:00, with the 12:15 lunch break the generator
+    # recognises inserted once the morning is full
+    slots = []
+    teaching = 0
+    lunch_added = False
+    start = datetime.datetime.combine(datetime.date.today(), FIRST_SLOT)
+    while teaching < count:
+        if start.time() >= datetime.time(12, 0) and not lunch_added:
+            slots.append(TimeSlot(start_time=LUNCH_BREAK_START, end_time=LUNCH_END))
+            start = datetime.datetime.combine(start.date(), LUNCH_END)
+            lunch_added = True
+            continue
+        end = start + datetime.timedelta(hours=1)
+        slots.append(TimeSlot(start_time=start.time(), end_time=end.time()))
+        teaching += 1
+        start = end
+    return slots
+
+# Replaces every department, stream, subject, professor, room and timeslot with a
+# synthetic university. density is the share of each stream's teaching cells
+# (days x non-lunch slots) filled by academic lectures; professors only teach in
+# their own department and get a weekly limit a little above what they are given.
+# The same arguments and seed always build the same data.
+@transaction.atomic
+def build_dataset(departments, streams, professors, subjects, rooms, labs, timeslots,
+                  density=0.7, non_academic=1, seed=0):
+    rng = random.Random(seed)
+    clear_dataset()
+    departments = max(1, departments)
+
+    department_objs = Department.objects.bulk_create(
+        Department(name=f'Department {i + 1}') for i in range(departments))
+    TimeSlot.objects.bulk_create(_timeslots(timeslots))
+    Location.objects.bulk_create(
+        [Location(name=f'R{i + 1:03d}', location_type='classroom', floor=i % 5) for i in range(rooms)]
+        + [Location(name=f'LAB{i + 1:03d}', location_type='lab', floor=i % 5) for i in range(labs)])
+
+    professor_objs = Professor.objects.bulk_create(
+        Professor(
+            name=f'Professor {i + 1}',
+            email=f'professor{i + 1}@example.com',
+            working_hours_start=datetime.time(8, 0),
+            working_hours_end=datetime.time(18, 0),
+            total_weekly_lectures=0,
+        )
+        for i in range(professors)
+    )
+    faculty = [[] for _ in department_objs]
+    for i, professor in enumerate(professor_objs):
+        faculty[i % departments].append(professor)
+
+    stream_objs = Stream.objects.bulk_create(
+        Stream(
+            name=f'Stream {i + 1}',
+            department=department_objs[i % departments],
+            division='A',
+            semester=i % 8 + 1,
+            academic_year='2025',
+            number_of_days=DAYS_PER_WEEK,
+            non_academic_lectures_per_week=non_academic,
+            coordinator=rng.choice(faculty[i % departments]) if faculty[i % departments] else None,
+        )
+        for i in range(streams)
+    )
+
+    # Spread each stream's academic lectures over its subjects; the first subject
+    # is a lab when there are labs to hold it
+    cells = DAYS_PER_WEEK * timeslots
+    lectures = int(round(cells * density))
+    subject_objs = []
+    subject_owner = []
+    for stream_index, stream in enumerate(stream_objs):
+        for k in range(subjects):
+            count = lectures // subjects + (1 if k < lectures % subjects else 0)
+            if count <= 0:
+                continue
+            kind = 'Lab' if k == 0 and labs else 'Subject'
+            subject_objs.append(Subject(
+                name=f'{kind} {stream_index + 1}.{k + 1}',
+                code=f'SYN{stream_index + 1:04d}{k + 1:02d}',
+                lectures_per_week=count,
+                lecture_duration_minutes=60,
+            ))
+            subject_owner.append(stream_index)
+    if non_academic:
+        subject_objs.append(Subject(name='Sports', code='SYN-SPORTS', lectures_per_week=0,
+                                    lecture_duration_minutes=60, is_non_academic=True))
+    subject_objs = Subject.objects.bulk_create(subject_objs)
+
+    load = {professor.pk: 0 for professor in professor_objs}
+    subject_links = []
+    stream_links = []
+    for subject, stream_index in zip(subject_objs, subject_owner):
+        stream_links.append(Stream.subjects.through(stream_id=stream_objs[stream_index].pk, subject_id=subject.pk))
+        pool = faculty[stream_index % departments]
+        if not pool:
+            continue
+        for professor in rng.sample(pool, min(len(pool), rng.randint(1, 2))):
+            subject_links.append(Subject.professors.through(subject_id=subject.pk, professor_id=professor.pk))
+            load[professor.pk] += subject.lectures_per_week
+    if non_academic:
+        stream_links.extend(Stream.subjects.through(stream_id=stream.pk, subject_id=subject_objs[-1].pk)
+                            for stream in stream_objs)
+    Subject.professors.through.objects.bulk_create(subject_links)
+    Stream.subjects.through.objects.bulk_create(stream_links)
+
+    for professor in professor_objs:
+        professor.total_weekly_lectures = load[professor.pk] + 2
+    Professor.objects.bulk_update(professor_objs, ['total_weekly_lectures'])
+
+    return {
+        'departments': departments,
+        'streams': streams,
+        'professors': professors,
+        'subjects': len(subject_objs),
+        'rooms': rooms,
+        'labs': labs,
+        'timeslots': timeslots,
+        'density': density,
+        'lectures': lectures * streams + non_academic * streams,
+        'seed': seed,
+    }
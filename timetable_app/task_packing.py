@@ -0,0 +1,110 @@
+import datetime
+import math
+from functools import reduce
+from operator import gt
+from django.db import transaction
+from .models import Task
+from .problem import DAYS
+
+# Value of one minute of work at each priority. A task is worth its length times
+# its weight, so the packer prefers filling free time with urgent work but still
+# uses leftover minutes for less urgent tasks.
+PRIORITY_WEIGHTS = {'high': 4, 'medium': 2, 'low': 1}
+
+def task_minutes(task):
+    # Rounded up, so a packed set of tasks never runs over the free time
+    return math.ceil(task.estimated_time.total_seconds() / 60)
+
+# The tasks to schedule in `minutes` of free time: a 0/1 knapsack over minutes
+# maximising the total priority-weighted time. tasks should be in priority order;
+# among equally valued selections the earlier tasks win. Returns a set of task ids.
+def pack_tasks(tasks, minutes):
+    items = []
+    chosen = set()
+    for task in tasks:
+        length = task_minutes(task)
+        if length <= 0:
+            chosen.add(task.id)
+        elif length <= minutes:
+            items.append((task.id, length, length * PRIORITY_WEIGHTS.get(task.priority, 1)))
+    if sum(length for _, length, _ in items) <= minutes:
+        return chosen | {task_id for task_id, _, _ in items}
+
+    # Lengths usually come in 5 or 15 minute steps; working in that unit shrinks the table
+    step = reduce(math.gcd, (length for _, length, _ in items))
+    capacity = minutes // step
+    best = [0] * (capacity + 1)
+    taken = []
+    for _, length, value in items:
+        size = length // step
+        with_item = [score + value for score in best[:capacity + 1 - size]]
+        # taken[i][c] is true when item i is in the best packing of c + size units
+        taken.append(bytes(map(gt, with_item, best[size:])))
+        best = best[:size] + list(map(max, best[size:], with_item))
+
+    remaining = capacity
+    for (task_id, length, _), took in zip(reversed(items), reversed(taken)):
+        size = length // step
+        if remaining >= size and took[remaining - size]:
+            chosen.add(task_id)
+            remaining -= size
+    return chosen
+
+# Places tasks into concrete free windows (free_time.FreeWindow, in time order):
+# each window in turn is packed with the best of the tasks not yet placed, and
+# its tasks run back to back from the window's start. Returns {task id: (day, start time)}.
+def place_tasks(tasks, windows):
+    remaining = list(tasks)
+    placements = {}
+    for window in windows:
+        if not remaining:
+            break
+        start = window.start.hour * 60 + window.start.minute
+        length = window.end.hour * 60 + window.end.minute - start
+        chosen = pack_tasks(remaining, length)
+        for task in remaining:
+            if task.id in chosen:
+                placements[task.id] = (window.day, datetime.time(start // 60, start % 60))
+                start += task_minutes(task)
+        remaining = [task for task in remaining if task.id not in chosen]
+    return placements
+
+# Sort key putting placed tasks in week order, ahead of tasks with no set time
+def schedule_order(task):
+    if task.scheduled_day is None:
+        return (1, 0, datetime.time.min)
+    return (0, DAYS.index(task.scheduled_day), task.scheduled_start or datetime.time.min)
+
+def _open_tasks(user):
+    return list(Task.objects.filter(user=user, is_completed=False)
+                .only('id', 'priority', 'estimated_time', 'is_scheduled', 'scheduled_day', 'scheduled_start')
+                .order_by('priority_rank', 'id'))
+
+def _save_placements(tasks, placements):
+    # Only tasks whose slot changes are written, in a single bulk UPDATE
+    changed = []
+    for task in tasks:
+        day, start = placements.get(task.id, (None, None))
+        scheduled = task.id in placements
+        if (task.is_scheduled, task.scheduled_day, task.scheduled_start) != (scheduled, day, start):
+            task.is_scheduled, task.scheduled_day, task.scheduled_start = scheduled, day, start
+            changed.append(task)
+    Task.objects.bulk_update(changed, ['is_scheduled', 'scheduled_day', 'scheduled_start'])
+
+# Re-plans a user's open tasks for `minutes` of free time, without placing them
+# at a time of day. Returns the number of scheduled tasks.
+def reschedule_user_tasks(user, minutes):
+    with transaction.atomic():
+        tasks = _open_tasks(user)
+        chosen = pack_tasks(tasks, max(minutes, 0))
+        _save_placements(tasks, {task_id: (None, None) for task_id in chosen})
+    return len(chosen)
+
+# Re-plans a user's open tasks into the free windows of their timetable.
+# Returns the number of scheduled tasks.
+def schedule_user_tasks(user, windows):
+    with transaction.atomic():
+        tasks = _open_tasks(user)
+        placements = place_tasks(tasks, windows)
+        _save_placements(tasks, placements)
+    return len(placements)
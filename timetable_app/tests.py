@@ -1,3 +1,353 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from django.conf import settings
+from django.db import connection, connections, transaction
+from collections import Counter
+from django.test import TestCase, TransactionTestCase, override_settings
+from . import jobs, timetable_generator
+from .grid import build_grids
+from .importer import DataImportError, import_data
+from .incremental import affected_stream_ids, mark_streams_stale, regenerate_stale_streams
+from .models import CustomUser, Department, GenerationJob, Professor, Stream, Subject, Task, TimetableEntry, TimetableVersion
+from .problem import load_problem
+from .snapshot import SNAPSHOT_TABLES, read_snapshot, restore_snapshot, snapshot_problem, write_snapshot
+from .solvers import build_lectures, get_solver
+from .task_packing import pack_tasks, reschedule_user_tasks
+from .synthetic import SIZES, build_dataset, clear_dataset
+from .timetable_generator import generate_timetable
+from .versions import active_version, live_entries
+
+
+@override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+class SQLiteProductionProfileTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            self.skipTest('Needs a file-based SQLite test database.')
+        # New connections pick up the production PRAGMAs
+        connections.close_all()
+        build_dataset(seed=1, **SIZES['small'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_timetable()
+        self.live_count = live_entries().count()
+
+    def tearDown(self):
+        connections.close_all()
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    # A writer whose changes outgrow its page cache spills them into the
+    # database file, which in the default rollback journal mode locks out
+    # every reader until it commits
+    def test_reads_proceed_while_a_write_spills_to_disk(self):
+        writing = threading.Event()
+        release = threading.Event()
+
+        def write_new_version():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA cache_size = 1')
+                with transaction.atomic():
+                    version = TimetableVersion.objects.create()
+                    TimetableEntry.objects.bulk_create(
+                        TimetableEntry(version=version, stream_id=entry.stream_id, subject_id=entry.subject_id,
+                                       day_of_week=entry.day_of_week, timeslot_id=entry.timeslot_id)
+                        for entry in live_entries()
+                    )
+                    writing.set()
+                    release.wait(30)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write_new_version)
+        writer.start()
+        try:
+            self.assertTrue(writing.wait(10))
+            start = time.monotonic()
+            self.assertEqual(live_entries().count(), self.live_count)
+            grids = build_grids('stream', Stream.objects.all())
+            self.assertEqual(sum(len(lectures) for grid in grids for row in grid.rows for lectures in row.cells), self.live_count)
+            # Served from the last committed state, without waiting for the writer
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            release.set()
+            writer.join()
+
+    # A write transaction held while a second writer starts: without busy_timeout
+    # the second writer fails with "database is locked". sqlite3's own connect
+    # timeout (5 seconds by default) is turned off so only the PRAGMA waits.
+    @override_settings(SQLITE_PRAGMAS={**settings.SQLITE_PRODUCTION_PRAGMAS, 'busy_timeout': 2000})
+    def test_a_second_writer_waits_for_the_first(self):
+        self.enterContext(mock.patch.dict(connection.settings_dict['OPTIONS'], {'timeout': 0}))
+        connections.close_all()
+        writing = threading.Event()
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    TimetableVersion.objects.create()
+                    writing.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write_slowly)
+        writer.start()
+        try:
+            self.assertTrue(writing.wait(10))
+            with transaction.atomic():
+                TimetableVersion.objects.create()
+        finally:
+            writer.join()
+        self.assertEqual(TimetableVersion.objects.filter(status='building').count(), 2)
+
+
+class GenerationJobTests(TransactionTestCase):
+    def setUp(self):
+        build_dataset(seed=1, **SIZES['tiny'])
+        self.stream = Stream.objects.order_by('id').first()
+
+    def run_job(self, job):
+        with contextlib.redirect_stdout(io.StringIO()):
+            jobs.run_generation_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_a_stream_edited_while_a_job_runs_keeps_its_flag_and_gets_a_follow_up_job(self):
+        solve = timetable_generator._solve
+
+        def edit_during_solve(*args):
+            mark_streams_stale([self.stream.pk])
+            return solve(*args)
+
+        job = GenerationJob.objects.create()
+        with mock.patch.object(timetable_generator, '_solve', edit_during_solve), \
+                mock.patch.object(jobs, '_executor') as executor:
+            job = self.run_job(job)
+
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(list(Stream.objects.filter(needs_regeneration=True)), [self.stream])
+        follow_up = GenerationJob.objects.get(kind='incremental')
+        executor.submit.assert_called_once_with(jobs.run_generation_job, follow_up.pk)
+
+        with mock.patch.object(jobs, '_executor') as executor:
+            follow_up = self.run_job(follow_up)
+        self.assertEqual(follow_up.status, 'succeeded')
+        self.assertFalse(Stream.objects.filter(needs_regeneration=True).exists())
+        executor.submit.assert_not_called()
+
+
+class BacktrackingSolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Dense enough that first-fit paints itself into a corner
+        build_dataset(density=0.95, seed=0, **SIZES['medium'])
+        cls.problem = load_problem()
+        cls.lectures = build_lectures(cls.problem)
+
+    def solve(self, engine, seed=None):
+        return get_solver(engine, seed=seed, time_limit=60).solve(self.problem, self.lectures)
+
+    def assert_valid(self, result):
+        placed = Counter((p.stream, p.subject) for p in result.placements)
+        placed.update((lecture.stream, lecture.subject) for lecture in result.unplaced)
+        self.assertEqual(placed, Counter(self.lectures))
+        for key in ('stream', 'professor', 'room'):
+            booked = Counter((getattr(p, key), p.day, p.slot) for p in result.placements if getattr(p, key) is not None)
+            self.assertEqual([cell for cell, count in booked.items() if count > 1], [], f'{key} double-booked')
+        for p in result.placements:
+            subject = self.problem.subjects[p.subject]
+            self.assertFalse(self.problem.timeslots[p.slot].is_lunch_break)
+            if p.professor is not None:
+                self.assertIn(p.professor, subject.professors)
+                self.assertEqual(self.problem.locations[p.room].location_type, subject.room_type)
+
+    def test_completes_a_timetable_greedy_cannot(self):
+        greedy = self.solve('greedy')
+        self.assertTrue(greedy.unplaced)
+        result = self.solve('backtracking')
+        self.assertEqual(result.unplaced, [])
+        self.assert_valid(result)
+
+    def test_the_same_seed_gives_the_same_timetable(self):
+        first = self.solve('backtracking', seed=3)
+        self.assertEqual(first.unplaced, [])
+        self.assert_valid(first)
+        self.assertEqual(self.solve('backtracking', seed=3).placements, first.placements)
+
+
+class IncrementalRegenerationTests(TestCase):
+    def setUp(self):
+        build_dataset(seed=1, **SIZES['small'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_timetable()
+        self.version = active_version()
+        self.subject = Subject.objects.filter(is_non_academic=False, stream__isnull=False).order_by('id').first()
+
+    def entries_by_stream(self):
+        entries = {}
+        for row in live_entries().values_list('stream_id', 'subject_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'):
+            entries.setdefault(row[0], set()).add(row)
+        return entries
+
+    # The subject edit as the Manage Data view makes it
+    def edit_subject(self, lectures_per_week):
+        stream_ids = affected_stream_ids(self.subject)
+        self.subject.lectures_per_week = lectures_per_week
+        self.subject.save()
+        stream_ids |= affected_stream_ids(self.subject)
+        mark_streams_stale(stream_ids)
+        return stream_ids
+
+    def regenerate(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return regenerate_stale_streams()
+
+    def test_only_the_streams_of_an_edited_subject_are_regenerated(self):
+        before = self.entries_by_stream()
+        stream_ids = self.edit_subject(self.subject.lectures_per_week - 1)
+        self.assertTrue(stream_ids)
+        self.assertLess(len(stream_ids), Stream.objects.count())
+
+        outcome = self.regenerate()
+        self.assertTrue(outcome.saved)
+        self.assertEqual(active_version().kind, 'incremental')
+        after = self.entries_by_stream()
+        for stream_id in before:
+            if stream_id not in stream_ids:
+                self.assertEqual(after[stream_id], before[stream_id])
+        for stream_id in stream_ids:
+            lectures = Counter(row[1] for row in after[stream_id])
+            self.assertEqual(lectures[self.subject.pk], self.subject.lectures_per_week)
+            self.assertEqual(len(after[stream_id]), len(before[stream_id]) - 1)
+        self.assertFalse(Stream.objects.filter(needs_regeneration=True).exists())
+
+    def test_a_failed_regeneration_leaves_the_timetable_and_flags_alone(self):
+        before = self.entries_by_stream()
+        stream_ids = self.edit_subject(100)
+
+        outcome = self.regenerate()
+        self.assertFalse(outcome.saved)
+        self.assertTrue(outcome.errors)
+        self.assertEqual(active_version(), self.version)
+        self.assertEqual(self.entries_by_stream(), before)
+        self.assertEqual(set(Stream.objects.filter(needs_regeneration=True).values_list('id', flat=True)), stream_ids)
+
+
+class TaskPackingTests(TestCase):
+    def task(self, id, priority, minutes):
+        return Task(id=id, priority=priority, estimated_time=datetime.timedelta(minutes=minutes))
+
+    def test_packs_the_most_valuable_set_of_tasks(self):
+        # Taking the first task that fits (40) leaves 20 minutes unused
+        tasks = [self.task(1, 'low', 40), self.task(2, 'low', 30), self.task(3, 'low', 30)]
+        self.assertEqual(pack_tasks(tasks, 60), {2, 3})
+        # 50 high + 40 low minutes (240) beat the two medium tasks (180)
+        tasks = [self.task(1, 'high', 50), self.task(2, 'medium', 45), self.task(3, 'medium', 45), self.task(4, 'low', 40)]
+        self.assertEqual(pack_tasks(tasks, 90), {1, 4})
+        # Everything fits, so everything is taken; tasks longer than the free time never are
+        self.assertEqual(pack_tasks(tasks, 180), {1, 2, 3, 4})
+        self.assertEqual(pack_tasks([self.task(1, 'high', 61)], 60), set())
+
+    def test_ties_go_to_the_higher_priority_task(self):
+        user = CustomUser.objects.create_user('student', password='x')
+        # Both are worth 40: 10 high minutes or 40 low ones. The low task is older.
+        low = Task.objects.create(user=user, task_name='Read', priority='low', estimated_time=datetime.timedelta(minutes=40))
+        high = Task.objects.create(user=user, task_name='Revise', priority='high', estimated_time=datetime.timedelta(minutes=10))
+        self.assertEqual(reschedule_user_tasks(user, 40), 1)
+        self.assertEqual(set(Task.objects.filter(is_scheduled=True)), {high})
+
+        # Equal priority and value: the older task wins
+        first = Task.objects.create(user=user, task_name='A', priority='medium', estimated_time=datetime.timedelta(minutes=30))
+        Task.objects.create(user=user, task_name='B', priority='medium', estimated_time=datetime.timedelta(minutes=30))
+        high.delete()
+        low.delete()
+        reschedule_user_tasks(user, 30)
+        self.assertEqual(set(Task.objects.filter(is_scheduled=True)), {first})
+
+
+class DataImportTests(TestCase):
+    PROFESSORS = (
+        'name,email,working_hours_start,working_hours_end,total_weekly_lectures,departments\n'
+        'Ada Lovelace,ada@example.com,09:00,17:00,10,Computing\n'
+        'Alan Turing,alan@example.com,09:00,17:00,12,Computing;Maths\n'
+    )
+
+    def load(self, *sources):
+        return import_data([(kind, io.StringIO(text), 'csv') for kind, text in sources])
+
+    def setUp(self):
+        self.load(('departments', 'name\nComputing\nMaths\n'), ('professors', self.PROFESSORS))
+
+    def test_existing_rows_are_updated_in_place(self):
+        ada = Professor.objects.get(email='ada@example.com')
+        counts = self.load(('professors', self.PROFESSORS.replace(',10,', ',14,').replace(
+            'Computing;Maths', 'Maths') + 'Grace Hopper,grace@example.com,08:00,16:00,8,Maths\n'))
+        self.assertEqual(counts, {'professors': (1, 2, 0)})
+        self.assertEqual(Professor.objects.count(), 3)
+        ada.refresh_from_db()
+        self.assertEqual(ada.total_weekly_lectures, 14)
+        alan = Professor.objects.get(email='alan@example.com')
+        self.assertEqual([d.name for d in alan.departments.all()], ['Maths'])
+        self.assertEqual(self.load(('professors', self.PROFESSORS)), {'professors': (0, 2, 0)})
+        self.assertEqual(self.load(('professors', self.PROFESSORS)), {'professors': (0, 0, 2)})
+
+    def test_a_malformed_row_is_reported_by_line(self):
+        with self.assertRaises(DataImportError) as raised:
+            self.load(('professors', self.PROFESSORS.replace(',12,', ',twelve,')))
+        [error] = raised.exception.errors
+        self.assertEqual((error.kind, error.line), ('professors', 3))
+        self.assertIn("'total_weekly_lectures' must be an integer", error.message)
+
+    def test_nothing_is_saved_when_any_row_fails(self):
+        with self.assertRaises(DataImportError):
+            self.load(
+                ('departments', 'name\nPhysics\n'),
+                ('professors', self.PROFESSORS.replace(',10,', ',14,') + 'Bad Row,bad@example.com,9am,17:00,1,Physics\n'),
+            )
+        self.assertFalse(Department.objects.filter(name='Physics').exists())
+        self.assertEqual(Professor.objects.get(email='ada@example.com').total_weekly_lectures, 10)
+        self.assertFalse(Professor.objects.filter(email='bad@example.com').exists())
+
+
+class SnapshotTests(TestCase):
+    def test_a_snapshot_restores_into_an_empty_database(self):
+        build_dataset(seed=1, **SIZES['small'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_timetable()
+
+        def contents():
+            tables = {name: list(model.objects.order_by(*columns[:2]).values_list(*columns)) for name, model, columns in SNAPSHOT_TABLES}
+            tables['entries'] = sorted(live_entries().values_list(
+                'stream_id', 'subject_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'))
+            return tables
+
+        before = contents()
+        self.assertTrue(before['entries'])
+        problem = load_problem()
+        handle, path = tempfile.mkstemp(suffix='.snapshot.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        counts = write_snapshot(path)
+        self.assertEqual(counts, {name: len(rows) for name, rows in before.items()})
+
+        clear_dataset()
+        self.assertEqual(sum(map(len, contents().values())), 0)
+        snapshot = read_snapshot(path)
+        self.assertEqual(snapshot_problem(snapshot), problem)
+        self.assertEqual(restore_snapshot(snapshot), counts)
+        self.assertEqual(contents(), before)
+        self.assertEqual(active_version().status, 'active')
 
-# Create your tests here.
@@ -1,119 +1,161 @@
-from django.db import transaction
-from .models import Professor, Location, Subject, Stream, TimetableEntry, TimeSlot
+from django.conf import settings
+from django.utils import timezone
+from .instrumentation import GenerationStats
+from .models import GenerationRun, TimetableEntry
+from .parallel import resolve_workers, solve_parallel, solve_restarts
+from .problem import DAYS, load_problem
+from .scoring import score_result
+from .solvers import build_lectures, get_solver
+from .utilization import summarize_version
+from .versions import publish_timetable
+from collections import Counter, namedtuple
 import random
+import time
 
-def generate_timetable():
+# Number of rows written per INSERT when saving the generated timetable
+DEFAULT_BATCH_SIZE = getattr(settings, 'TIMETABLE_BULK_BATCH_SIZE', 500)
+
+# What a generation run did: the solver result (None if it never got to solving),
+# the problems it ran into, whether the new timetable was saved, the seed used and
+# the TimetableVersion it was saved as
+GenerationOutcome = namedtuple('GenerationOutcome', 'result errors saved seed version', defaults=(None, None))
+
+def build_entries(problem, placements):
+    entries = []
+    for placement in placements:
+        entries.append(TimetableEntry(
+            stream_id=problem.streams[placement.stream].id,
+            subject_id=problem.subjects[placement.subject].id,
+            # No professor or location for non-academic lectures
+            professor_id=None if placement.professor is None else problem.professors[placement.professor].id,
+            location_id=None if placement.room is None else problem.locations[placement.room].id,
+            day_of_week=DAYS[placement.day],
+            timeslot_id=problem.timeslots[placement.slot].id
+        ))
+    return entries
+
+def report_unplaced(problem, unplaced):
+    errors = []
+    for lecture, count in Counter(unplaced).items():
+        subject = problem.subjects[lecture.subject]
+        stream = problem.streams[lecture.stream]
+        errors.append(f"Could not find a valid slot for {subject.name} in {stream.name} ({count} lecture(s)). Timetable incomplete.")
+    for error in errors:
+        print(error)
+    return errors
+
+def restart_seeds(restarts, seed=None):
+    # A single run keeps the given seed (None = deterministic first-fit). Several
+    # runs use consecutive seeds from a base that is drawn at random when not given,
+    # so any of them can be repeated with --seed <n> --restarts 1 --workers 1 (each
+    # restart solves the whole problem at once; with more workers a single run is
+    # split into stream clusters and gives a different timetable).
+    if restarts <= 1:
+        return [seed]
+    base = seed if seed is not None else random.randrange(2 ** 31)
+    return [base + i for i in range(restarts)]
+
+# Stores the GenerationRun history row for a finished run
+def record_run(kind, parameters, stats, outcome, started_at, duration):
+    result = outcome.result
+    return GenerationRun.objects.create(
+        kind=kind,
+        started_at=started_at,
+        duration_seconds=round(duration, 6),
+        parameters=parameters,
+        saved=outcome.saved,
+        placed_lectures=len(result.placements) if result else 0,
+        unplaced_lectures=len(result.unplaced) if result else 0,
+        timings=stats.as_dict()['timings'],
+        counters=stats.as_dict()['counters'],
+        version=outcome.version,
+    )
+
+# progress, when given, is called as progress(placed, total) while lectures are placed
+def generate_timetable(batch_size=None, engine=None, time_limit=None, workers=None, restarts=1, seed=None, progress=None):
     print("Starting timetable generation...")
-    
-    with transaction.atomic():
-        TimetableEntry.objects.all().delete()
-        
-        all_time_slots = list(TimeSlot.objects.all())
-        all_locations = list(Location.objects.all())
-        all_professors = list(Professor.objects.all())
-        all_streams = list(Stream.objects.all())
-        all_days = ['mon', 'tue', 'wed', 'thu', 'fri']
-
-        if not all_time_slots or not all_locations or not all_professors or not all_streams:
-            print("Error: Incomplete data. Please add professors, locations, time slots, and streams.")
-            return
-
-        for stream in all_streams:
-            subjects_to_schedule = list(stream.subjects.all())
-            
-            # Simple list to keep track of assignments to avoid conflicts
-            assigned_slots = []
-            
-            # First, schedule all academic subjects
-            academic_subjects = [s for s in subjects_to_schedule if not s.is_non_academic]
-            for subject in academic_subjects:
-                for _ in range(subject.lectures_per_week):
-                    slot_found = False
-                    for day_index in range(stream.number_of_days):
-                        day = all_days[day_index]
-                        for timeslot in all_time_slots:
-                            
-                            is_lunch_break = timeslot.start_time.hour == 12 and timeslot.start_time.minute == 15
-                            if is_lunch_break:
-                                continue
-                            
-                            # Find professor
-                            for professor in subject.professors.all():
-                                # Check for professor's weekly lecture limit
-                                professor_lectures_count = len([s for s in assigned_slots if s[2] == professor])
-                                if professor_lectures_count >= professor.total_weekly_lectures:
-                                    continue
-                                    
-                                professor_conflict = any(s[2] == professor for s in assigned_slots if s[0] == day and s[1] == timeslot)
-                                if professor_conflict:
-                                    continue
-                                
-                                # Find location
-                                location = None
-                                location_conflict = any(s[3] == location for s in assigned_slots if s[0] == day and s[1] == timeslot)
-                                
-                                if 'lab' in subject.name.lower():
-                                    available_locations = [loc for loc in all_locations if loc.location_type == 'lab' and not any(s[3] == loc for s in assigned_slots if s[0] == day and s[1] == timeslot)]
-                                    if available_locations:
-                                        location = available_locations[0]
-                                else:
-                                    available_classrooms = [loc for loc in all_locations if loc.location_type == 'classroom' and not any(s[3] == loc for s in assigned_slots if s[0] == day and s[1] == timeslot)]
-                                    if available_classrooms:
-                                        location = available_classrooms[0]
-                                
-                                if location:
-                                    TimetableEntry.objects.create(
-                                        stream=stream,
-                                        subject=subject,
-                                        professor=professor,
-                                        location=location,
-                                        day_of_week=day,
-                                        timeslot=timeslot
-                                    )
-                                    assigned_slots.append((day, timeslot, professor, location))
-                                    slot_found = True
-                                    break
-                                
-                            if slot_found:
-                                break
-                        if slot_found:
-                            break
-                    if not slot_found:
-                        print(f"Could not find a valid slot for {subject.name} in {stream.name}. Timetable incomplete.")
-                        return
-                        
-            # Now, fill the remaining slots with non-academic subjects
-            non_academic_subjects = [s for s in subjects_to_schedule if s.is_non_academic]
-            for subject in non_academic_subjects:
-                for _ in range(stream.non_academic_lectures_per_week):
-                    slot_found = False
-                    for day_index in range(stream.number_of_days):
-                        day = all_days[day_index]
-                        for timeslot in all_time_slots:
-                            
-                            is_lunch_break = timeslot.start_time.hour == 12 and timeslot.start_time.minute == 15
-                            if is_lunch_break:
-                                continue
-                            
-                            # Check if the slot is empty
-                            is_slot_empty = not any(s for s in assigned_slots if s[0] == day and s[1] == timeslot)
-                            if is_slot_empty:
-                                TimetableEntry.objects.create(
-                                    stream=stream,
-                                    subject=subject,
-                                    professor=None, # No professor for non-academic
-                                    location=None, # No location for non-academic
-                                    day_of_week=day,
-                                    timeslot=timeslot
-                                )
-                                assigned_slots.append((day, timeslot, None, None))
-                                slot_found = True
-                                break
-                        if slot_found:
-                            break
-                    if not slot_found:
-                        print(f"Could not find a valid slot for {subject.name} in {stream.name}. Timetable incomplete.")
-                        return
-                        
-
-    print("Timetable generated and saved successfully!")
\ No newline at end of file
+
+    stats = GenerationStats()
+    started_at = timezone.now()
+    start = time.perf_counter()
+    outcome = _generate(stats, batch_size, engine, time_limit, workers, restarts, seed, progress)
+    parameters = {
+        'engine': engine or 'greedy',
+        'batch_size': batch_size or DEFAULT_BATCH_SIZE,
+        'time_limit': time_limit,
+        'workers': resolve_workers(workers),
+        'restarts': restarts,
+        'seed': outcome.seed,
+    }
+    record_run('full', parameters, stats, outcome, started_at, time.perf_counter() - start)
+    print(stats.summary())
+    return outcome
+
+# Runs the chosen engine (once, in parallel, or as scored restarts) on a loaded
+# problem; returns the solver, its result and the seed of the kept run
+def _solve(stats, problem, engine, time_limit, workers, restarts, seed, progress):
+    solver = get_solver(engine, time_limit=time_limit, seed=seed, progress=progress, stats=stats)
+    seeds = restart_seeds(restarts, seed)
+    if len(seeds) > 1:
+        runs = solve_restarts(problem, seeds, solver.name, time_limit, workers, stats)
+        with stats.phase('scoring'):
+            scored = [(score_result(problem, result), seed, result) for seed, result in runs]
+        for score, run_seed, _ in scored:
+            print(f"Seed {run_seed}: score {score.total} ({score.unplaced} unplaced, {score.repeats} same-day repeats, {score.gaps} gaps, imbalance {score.imbalance})")
+        score, seed, result = min(scored, key=lambda run: (run[0].total, run[1]))
+        print(f"Best of {len(seeds)} runs: seed {seed} with score {score.total}. Rerun with --seed {seed} --restarts 1 --workers 1 to reproduce it.")
+    elif resolve_workers(workers) > 1:
+        result = solve_parallel(problem, solver.name, time_limit, workers, seed, stats)
+    else:
+        result = solver.solve(problem, build_lectures(problem))
+    return solver, result, seed
+
+def _is_incomplete(problem):
+    return not problem.timeslots or not problem.locations or not problem.professors or not problem.streams
+
+def _generate(stats, batch_size, engine, time_limit, workers, restarts, seed, progress):
+    with stats.phase('load'):
+        # Streams marked stale after this point stay flagged when the result is published
+        loaded_at = timezone.now()
+        problem = load_problem()
+
+    if _is_incomplete(problem):
+        error = "Error: Incomplete data. Please add professors, locations, time slots, and streams."
+        print(error)
+        return GenerationOutcome(None, [error], False, seed)
+
+    solver, result, seed = _solve(stats, problem, engine, time_limit, workers, restarts, seed, progress)
+
+    # An incomplete result is never saved, so the current timetable stays intact
+    if result.unplaced:
+        errors = report_unplaced(problem, result.unplaced)
+        print("The existing timetable was left unchanged.")
+        return GenerationOutcome(result, errors, False, seed)
+
+    # Written as a new version; readers switch to it only once it is complete
+    with stats.phase('persistence'):
+        version = publish_timetable(build_entries(problem, result.placements), batch_size or DEFAULT_BATCH_SIZE, loaded_at=loaded_at)
+    with stats.phase('summaries'):
+        summarize_version(version)
+
+    print(f"Timetable generated and saved successfully with the {solver.name} engine!")
+    return GenerationOutcome(result, [], True, seed, version)
+
+# Solves a problem that was not read from the database, e.g. one loaded from a
+# snapshot file. Nothing is saved or recorded, so it runs without a database.
+def solve_offline(problem, engine=None, time_limit=None, workers=None, restarts=1, seed=None, progress=None):
+    print("Solving offline problem instance...")
+
+    stats = GenerationStats()
+    if _is_incomplete(problem):
+        error = "Error: Incomplete data. The problem needs professors, locations, time slots, and streams."
+        print(error)
+        return GenerationOutcome(None, [error], False, seed)
+
+    solver, result, seed = _solve(stats, problem, engine, time_limit, workers, restarts, seed, progress)
+    errors = report_unplaced(problem, result.unplaced) if result.unplaced else []
+    score = score_result(problem, result)
+    print(f"Placed {len(result.placements)} lectures with the {solver.name} engine "
+          f"(score {score.total}, seed {seed}). Nothing was saved.")
+    print(stats.summary())
+    return GenerationOutcome(result, errors, False, seed)
\ No newline at end of file
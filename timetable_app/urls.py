@@ -12,9 +12,16 @@ urlpatterns = [
     path('reschedule-tasks/', views.reschedule_tasks, name='reschedule_tasks'),
     path('update-user-role/<int:user_id>/', views.update_user_role, name='update_user_role'),
     path('run-generator/', views.run_generator_view, name='run_generator'),
+    path('generation-jobs/<int:job_id>/status/', views.generation_job_status, name='generation_job_status'),
     path('download-timetable/', views.download_timetable, name='download_timetable'),
     path('download-locations/', views.download_location_sheet, name='download_location_sheet'),
+    path('reports/utilization/', views.utilization_report, name='utilization_report'),
+    path('reports/utilization/<str:kind>.csv', views.download_utilization_report, name='download_utilization_report'),
+    path('calendar/<str:kind>/<int:pk>.ics', views.timetable_feed, name='timetable_feed'),
+    path('api/timetable/entries/', views.timetable_entries_api, name='timetable_entries_api'),
+    path('api/rooms/free/', views.free_rooms_api, name='free_rooms_api'),
     path('manage-data/', views.manage_data, name='manage_data'),
+    path('manage-data/import/', views.import_data_view, name='import_data'),
     path('add/<str:model_name>/', views.add_data, name='add_data'),
     path('edit/<str:model_name>/<int:pk>/', views.edit_data, name='edit_data'),
     path('delete/<str:model_name>/<int:pk>/', views.delete_data, name='delete_data'),
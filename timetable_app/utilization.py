@@ -0,0 +1,82 @@
+from bisect import bisect_left, bisect_right
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from .models import (Location, LocationUtilization, Professor, ProfessorUtilization, Stream, StreamUtilization,
+                     TimeSlot, TimetableEntry)
+from .problem import DAYS, LUNCH_BREAK_START
+
+# Report kind -> (summary model, CSV/table header, columns, ordering). Reports
+# read only these precomputed rows (and the owner's name), never the entries.
+REPORTS = {
+    'professors': (
+        ProfessorUtilization,
+        ['Professor', 'Scheduled Lectures', 'Weekly Limit', 'Load (%)'],
+        ('professor__name', 'scheduled_lectures', 'weekly_limit', 'load_percent'),
+        ('-load_percent', 'professor__name'),
+    ),
+    'rooms': (
+        LocationUtilization,
+        ['Room', 'Type', 'Floor', 'Booked Slots', 'Available Slots', 'Utilization (%)'],
+        ('location__name', 'location__location_type', 'location__floor', 'booked_slots', 'available_slots', 'utilization_percent'),
+        ('-utilization_percent', 'location__name'),
+    ),
+    'streams': (
+        StreamUtilization,
+        ['Stream', 'Division', 'Semester', 'Scheduled Lectures', 'Teaching Days', 'Gap Slots'],
+        ('stream__name', 'stream__division', 'stream__semester', 'scheduled_lectures', 'teaching_days', 'gap_slots'),
+        ('-gap_slots', 'stream__name'),
+    ),
+}
+
+def _percent(part, whole):
+    return round(100 * part / whole, 1) if whole else 0.0
+
+# Writes the utilization summaries of a timetable version: one GROUP BY query
+# per summary, then one bulk insert each. Safe to run again for the same version.
+def summarize_version(version):
+    teaching_starts = sorted(TimeSlot.objects.exclude(start_time=LUNCH_BREAK_START).values_list('start_time', flat=True))
+    in_version = Q(timetableentry__version=version)
+
+    professors = [
+        ProfessorUtilization(version=version, professor_id=id, scheduled_lectures=scheduled,
+                             weekly_limit=limit, load_percent=_percent(scheduled, limit))
+        for id, limit, scheduled in Professor.objects.annotate(scheduled=Count('timetableentry', filter=in_version))
+        .values_list('id', 'total_weekly_lectures', 'scheduled').order_by()
+    ]
+
+    available = len(teaching_starts) * len(DAYS)
+    locations = [
+        LocationUtilization(version=version, location_id=id, booked_slots=booked,
+                            available_slots=available, utilization_percent=_percent(booked, available))
+        for id, booked in Location.objects.annotate(booked=Count('timetableentry', filter=in_version))
+        .values_list('id', 'booked').order_by()
+    ]
+
+    # A day's gaps are the teaching slots between its first and last lecture
+    # that hold no lecture; the lunch break never counts as one
+    days = {}
+    day_rows = (TimetableEntry.objects.filter(version=version).exclude(timeslot=None)
+                .exclude(timeslot__start_time=LUNCH_BREAK_START)
+                .values('stream_id', 'day_of_week')
+                .annotate(first=Min('timeslot__start_time'), last=Max('timeslot__start_time'), used=Count('timeslot', distinct=True))
+                .values_list('stream_id', 'first', 'last', 'used').order_by())
+    for stream_id, first, last, used in day_rows:
+        span = bisect_right(teaching_starts, last) - bisect_left(teaching_starts, first)
+        teaching_days, gaps = days.get(stream_id, (0, 0))
+        days[stream_id] = (teaching_days + 1, gaps + max(span - used, 0))
+    streams = [
+        StreamUtilization(version=version, stream_id=id, scheduled_lectures=scheduled,
+                          teaching_days=days.get(id, (0, 0))[0], gap_slots=days.get(id, (0, 0))[1])
+        for id, scheduled in Stream.objects.annotate(scheduled=Count('timetableentry', filter=in_version))
+        .values_list('id', 'scheduled').order_by()
+    ]
+
+    with transaction.atomic():
+        for model, rows in ((ProfessorUtilization, professors), (LocationUtilization, locations), (StreamUtilization, streams)):
+            model.objects.filter(version=version).delete()
+            model.objects.bulk_create(rows, batch_size=500)
+
+# The rows of one report for a version, as tuples in REPORTS column order
+def report_rows(kind, version):
+    model, _, columns, ordering = REPORTS[kind]
+    return model.objects.filter(version=version).order_by(*ordering).values_list(*columns)
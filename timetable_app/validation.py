@@ -0,0 +1,129 @@
+from collections import namedtuple
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Least
+from .models import Professor, Location, Subject, Stream, TimeSlot
+from .problem import DAYS, LUNCH_BREAK_START
+
+# A problem found in the data. code names the check that failed; model and
+# object_id point at the offending row (None when it is about the data as a
+# whole). str() gives the message shown to users.
+class DataError(namedtuple('DataError', 'code message model object_id')):
+    __slots__ = ()
+
+    def __str__(self):
+        return self.message
+
+StreamSubject = Stream.subjects.through
+
+# Same rule as problem._room_type, as a database expression on a subject name
+def _room_type(name_field):
+    return Case(When(**{f'{name_field}__icontains': 'lab'}, then=Value('lab')), default=Value('classroom'))
+
+# Checks that timetable generation is possible and returns a list of DataError
+# (empty when the data is valid). Every check is a single aggregate query, so
+# the cost does not grow with the number of rows fetched. The capacity checks are
+# necessary conditions only: passing them does not guarantee a timetable exists,
+# but failing them proves it cannot.
+def find_data_errors():
+    errors = []
+    errors += _subject_errors()
+    errors += _stream_errors()
+    errors += _professor_errors()
+
+    has_locations = Location.objects.exists()
+    usable_slots = TimeSlot.objects.exclude(start_time=LUNCH_BREAK_START).count()
+    if not has_locations:
+        errors.append(DataError('no_locations', "No locations have been added to the database.", None, None))
+    if not TimeSlot.objects.exists():
+        errors.append(DataError('no_timeslots', "No time slots have been added to the database.", None, None))
+    if has_locations and usable_slots:
+        errors += _room_capacity_errors(usable_slots)
+        errors += _stream_capacity_errors(usable_slots)
+        errors += _professor_capacity_errors(usable_slots)
+    return errors
+
+# Academic subjects must have a professor and lectures
+def _subject_errors():
+    errors = []
+    rows = (Subject.objects.filter(is_non_academic=False)
+            .annotate(professor_count=Count('professors'))
+            .filter(Q(professor_count=0) | Q(lectures_per_week__lte=0))
+            .order_by('id').values_list('id', 'name', 'professor_count', 'lectures_per_week'))
+    for id, name, professor_count, lectures in rows:
+        if not professor_count:
+            errors.append(DataError('subject_without_professor', f"Academic Subject '{name}' has no professor assigned.", 'subject', id))
+        if lectures <= 0:
+            errors.append(DataError('subject_without_lectures', f"Academic Subject '{name}' has 0 or fewer lectures per week.", 'subject', id))
+    return errors
+
+# All streams must have subjects
+def _stream_errors():
+    rows = (Stream.objects.annotate(subject_count=Count('subjects')).filter(subject_count=0)
+            .order_by('id').values_list('id', 'name'))
+    return [DataError('stream_without_subjects', f"Stream '{name}' has no subjects assigned.", 'stream', id) for id, name in rows]
+
+# Professor workload is manageable and working hours make sense
+def _professor_errors():
+    errors = []
+    rows = (Professor.objects.annotate(lectures_needed=Coalesce(Sum('subject__lectures_per_week'), 0))
+            .filter(Q(lectures_needed__gt=F('total_weekly_lectures')) | Q(working_hours_start__gte=F('working_hours_end')))
+            .order_by('id').values_list('id', 'name', 'lectures_needed', 'total_weekly_lectures', 'working_hours_start', 'working_hours_end'))
+    for id, name, lectures_needed, weekly_limit, start, end in rows:
+        if lectures_needed > weekly_limit:
+            errors.append(DataError('professor_over_limit', f"Professor '{name}' has more lectures assigned ({lectures_needed}) than their weekly limit ({weekly_limit}).", 'professor', id))
+        if start >= end:
+            errors.append(DataError('professor_invalid_hours', f"Professor '{name}' has invalid working hours.", 'professor', id))
+    return errors
+
+# Weekly academic lectures needing each room type vs. rooms x slots x days
+def _room_capacity_errors(usable_slots):
+    days = min(Stream.objects.aggregate(days=Max('number_of_days'))['days'] or 0, len(DAYS))
+    rooms = dict(Location.objects.values_list('location_type').annotate(count=Count('id')))
+    demand = (StreamSubject.objects.filter(subject__is_non_academic=False)
+              .annotate(room_type=_room_type('subject__name'))
+              .values_list('room_type').annotate(lectures=Sum('subject__lectures_per_week')).order_by('room_type'))
+    errors = []
+    for room_type, lectures in demand:
+        capacity = rooms.get(room_type, 0) * usable_slots * days
+        if lectures > capacity:
+            errors.append(DataError('room_capacity', (
+                f"Streams need {lectures} {room_type} lectures a week, but {rooms.get(room_type, 0)} {room_type}(s) "
+                f"x {usable_slots} slots x {days} days only hold {capacity}."
+            ), None, None))
+    return errors
+
+# A stream's weekly lectures vs. its days x slots
+def _stream_capacity_errors(usable_slots):
+    rows = (Stream.objects.annotate(
+                academic=Coalesce(Sum('subjects__lectures_per_week', filter=Q(subjects__is_non_academic=False)), 0),
+                non_academic_subjects=Count('subjects', filter=Q(subjects__is_non_academic=True)),
+                days=Least('number_of_days', Value(len(DAYS))),
+            )
+            .annotate(demand=F('academic') + F('non_academic_lectures_per_week') * F('non_academic_subjects'))
+            .filter(demand__gt=F('days') * usable_slots)
+            .order_by('id').values_list('id', 'name', 'demand', 'days'))
+    return [
+        DataError('stream_capacity', (
+            f"Stream '{name}' needs {demand} lectures a week but only has {days * usable_slots} slots "
+            f"({days} days x {usable_slots} slots)."
+        ), 'stream', id)
+        for id, name, demand, days in rows
+    ]
+
+# Lectures only one professor can teach vs. the slots that professor can reach:
+# the slots of the days their streams meet
+def _professor_capacity_errors(usable_slots):
+    sole_taught = (Subject.objects.filter(is_non_academic=False)
+                   .annotate(professor_count=Count('professors')).filter(professor_count=1).values('id'))
+    rows = (StreamSubject.objects.filter(subject__in=sole_taught)
+            .values_list('subject__professors', 'subject__professors__name')
+            .annotate(demand=Sum('subject__lectures_per_week'), days=Max('stream__number_of_days'))
+            .order_by('subject__professors'))
+    errors = []
+    for id, name, demand, days in rows:
+        capacity = min(days, len(DAYS)) * usable_slots
+        if demand > capacity:
+            errors.append(DataError('professor_capacity', (
+                f"Professor '{name}' is the only teacher for {demand} lectures a week but can reach only {capacity} slots."
+            ), 'professor', id))
+    return errors
@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Stream, TimetableEntry, TimetableVersion
+
+# Retired versions kept after a switch-over; older ones are pruned in the background
+KEEP_VERSIONS = getattr(settings, 'TIMETABLE_KEEP_VERSIONS', 2)
+
+# A version still 'building' after this long was left behind by a crashed run
+ABANDONED_AFTER = timedelta(hours=1)
+
+# One background thread, so prunes never run concurrently with each other
+_pruner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timetable-pruning')
+
+def active_version():
+    return TimetableVersion.objects.filter(status='active').first()
+
+# Seconds anything cached under cache_version() is kept. Those keys change with
+# every new timetable version or data edit, so stale entries are never read and
+# this only bounds how long they linger.
+CACHE_TIMEOUT = getattr(settings, 'TIMETABLE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+# Cache version for anything rendered from the active timetable: it changes when
+# a new version is activated and when touch_active_version() records a data edit
+def cache_version():
+    row = TimetableVersion.objects.filter(status='active').values_list('pk', 'revision').first()
+    return f'{row[0]}.{row[1]}' if row else 'none'
+
+# For data edits that change what the timetable shows (names, rooms) without a
+# new version being generated. Revisions only grow, across versions too, so they
+# also serve as the SEQUENCE of calendar feed events.
+def touch_active_version():
+    TimetableVersion.objects.filter(status='active').update(revision=F('revision') + 1)
+
+# Entries of the active timetable. Every reader goes through this, so a version
+# being built or pruned is never visible.
+def live_entries():
+    return TimetableEntry.objects.filter(version__status='active')
+
+def _write_batches(entries, batch_size):
+    # Every batch commits on its own: nothing reads a version before it is active,
+    # so there is no need to hold one long write transaction
+    for start in range(0, len(entries), batch_size):
+        TimetableEntry.objects.bulk_create(entries[start:start + batch_size])
+
+def _copy_entries(source, target, exclude_stream_ids, batch_size):
+    rows = (TimetableEntry.objects.filter(version=source).exclude(stream_id__in=exclude_stream_ids)
+            .values_list('stream_id', 'subject_id', 'professor_id', 'location_id', 'day_of_week', 'timeslot_id'))
+    batch = []
+    for stream_id, subject_id, professor_id, location_id, day, timeslot_id in rows.iterator(chunk_size=batch_size):
+        batch.append(TimetableEntry(
+            version_id=target.pk,
+            stream_id=stream_id,
+            subject_id=subject_id,
+            professor_id=professor_id,
+            location_id=location_id,
+            day_of_week=day,
+            timeslot_id=timeslot_id,
+        ))
+        if len(batch) >= batch_size:
+            _write_batches(batch, batch_size)
+            batch = []
+    _write_batches(batch, batch_size)
+
+# The switch-over: one short transaction retires the active version (which must
+# still be `expected` when given), activates the new one and clears the
+# regeneration flags of the streams it covers, except those marked stale after
+# loaded_at (the run did not see that change). Returns False if another version
+# was activated in the meantime.
+def _activate(version, expected=None, stream_ids=None, loaded_at=None):
+    now = timezone.now()
+    with transaction.atomic():
+        current = TimetableVersion.objects.select_for_update().filter(status='active')
+        if expected is not None and list(current.values_list('pk', flat=True)) != [expected.pk]:
+            return False
+        # The revision carries on from the version being replaced, so it never goes back
+        previous = current.values_list('revision', flat=True).first()
+        revision = 0 if previous is None else previous + 1
+        current.update(status='retired', retired_at=now)
+        TimetableVersion.objects.filter(pk=version.pk).update(status='active', activated_at=now, revision=revision)
+        streams = Stream.objects.all() if stream_ids is None else Stream.objects.filter(id__in=stream_ids)
+        if loaded_at is not None:
+            streams = streams.filter(Q(stale_since=None) | Q(stale_since__lt=loaded_at))
+        streams.update(needs_regeneration=False)
+        transaction.on_commit(schedule_pruning)
+    version.status = 'active'
+    version.activated_at = now
+    version.revision = revision
+    return True
+
+# Writes entries into a new version and makes it the live timetable. For an
+# incremental run, base is the version the solver planned around: the entries of
+# its other streams are carried over, and the switch only happens if base is
+# still the active version. Until the switch readers keep seeing the old
+# timetable; if anything fails the new version is discarded and they never see it.
+# loaded_at is when the run read its data, see _activate.
+# Returns the new version, or None when base was replaced during the run.
+def publish_timetable(entries, batch_size, kind='full', base=None, stream_ids=None, loaded_at=None):
+    version = TimetableVersion.objects.create(kind=kind)
+    try:
+        if base is not None:
+            _copy_entries(base, version, stream_ids, batch_size)
+        for entry in entries:
+            entry.version_id = version.pk
+        _write_batches(entries, batch_size)
+        activated = _activate(version, expected=base, stream_ids=stream_ids, loaded_at=loaded_at)
+    except Exception:
+        delete_versions([version.pk])
+        raise
+    if not activated:
+        delete_versions([version.pk])
+        return None
+    return version
+
+def delete_versions(version_ids):
+    # Nothing cascades from entries and no delete signals are connected, so the
+    # cascade deletes them in one DELETE statement without loading any
+    TimetableVersion.objects.filter(pk__in=version_ids).delete()
+
+# Removes retired versions beyond the newest `keep` and abandoned builds. Returns
+# the number of versions deleted.
+def prune_versions(keep=None):
+    keep = KEEP_VERSIONS if keep is None else keep
+    retired = TimetableVersion.objects.filter(status='retired').order_by('-activated_at', '-pk')
+    doomed = list(retired.values_list('pk', flat=True)[keep:])
+    doomed += TimetableVersion.objects.filter(
+        status='building', created_at__lt=timezone.now() - ABANDONED_AFTER,
+    ).values_list('pk', flat=True)
+    if doomed:
+        delete_versions(doomed)
+    return len(doomed)
+
+def _prune_in_background():
+    try:
+        prune_versions()
+    finally:
+        # The pruning thread's connection is not managed by a request cycle
+        connection.close()
+
+def schedule_pruning():
+    _pruner.submit(_prune_in_background)
@@ -1,17 +1,39 @@
+import io
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from .forms import CustomUserCreationForm, TaskForm, ProfessorForm, StreamForm, LocationForm, SubjectForm, DepartmentForm, TimeSlotForm
-from .models import TimetableEntry, Stream, CustomUser, Task, Location, Professor, Subject, Department, TimeSlot
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from .forms import CustomUserCreationForm, TaskForm, ProfessorForm, StreamForm, LocationForm, SubjectForm, DepartmentForm, TimeSlotForm, DataImportForm
+from .models import TimetableEntry, Stream, CustomUser, Task, Location, Professor, Subject, Department, TimeSlot, GenerationJob
 from django.db.models import Sum
-import csv
 from django.http import HttpResponse
-from datetime import timedelta
-from timetable_app.timetable_generator import generate_timetable
-from timetable_app.management.commands.validate_data import Command as ValidateCommand
-from io import StringIO
+from timetable_app.exports import EXPORT_CHUNK_SIZE, csv_lines, location_rows, timetable_rows
+from timetable_app.fragments import rendered_grids
+from timetable_app.grid import grid_page
+from timetable_app.incremental import affected_stream_ids, mark_streams_stale
+from timetable_app.jobs import fail_abandoned_jobs, submit_generation_job
+from timetable_app.validation import find_data_errors
+from timetable_app.ical import FEED_KINDS, build_calendar, feed_url, valid_feed_token
+from timetable_app.versions import active_version, live_entries, touch_active_version
+from django.core.cache import cache
+from django.views.decorators.http import condition, require_safe
+from timetable_app.api import entry_etag, entry_page, parse_entry_query
+from timetable_app.task_packing import reschedule_user_tasks, schedule_order, schedule_user_tasks
+from timetable_app.free_time import free_windows, timetable_owner, upcoming_windows
+from timetable_app.room_finder import free_rooms, occupancy_map, parse_free_room_query
+from timetable_app.importer import DataImportError, format_for, import_columns, import_data
+from timetable_app.utilization import REPORTS as UTILIZATION_REPORTS, report_rows
 from django.db.models import F
+from django.utils import timezone
+
+# Marks the streams touched by a data change and, once a timetable exists, queues a background
+# job regenerating only those. Cached timetable fragments are invalidated either way, as names
+# shown in them may have changed.
+def refresh_timetable(stream_ids, user=None):
+    touch_active_version()
+    mark_streams_stale(stream_ids)
+    if stream_ids and live_entries().exists():
+        submit_generation_job(user=user, kind='incremental')
 
 # Home page view
 def home(request):
@@ -50,21 +72,30 @@ def dashboard(request):
     
     # Data for all users
     all_users = CustomUser.objects.all()
+    latest_job = None
     
     # Get user-specific data for task scheduler
     form = TaskForm()
     scheduled_tasks = []
     pending_tasks = []
+    free_time_windows = None
     
     # Filter the timetable based on user role and selected stream
     if request.user.is_superuser or request.user.role == 'admin':
+        latest_job = GenerationJob.objects.first()
+        timetable_streams = Stream.objects.order_by('id')
         if selected_stream_id:
-            timetable_entries = TimetableEntry.objects.filter(stream__id=selected_stream_id).order_by('day_of_week', 'timeslot__start_time')
-        else:
-            timetable_entries = TimetableEntry.objects.all().order_by('day_of_week', 'timeslot__start_time')
+            timetable_streams = timetable_streams.filter(id=selected_stream_id)
+        timetable_page = grid_page(timetable_streams, request.GET.get('page'), build=rendered_grids)
     else:
-        first_stream = Stream.objects.first()
-        timetable_entries = TimetableEntry.objects.filter(stream=first_stream).order_by('day_of_week', 'timeslot__start_time')
+        # Teachers see their own timetable, students their stream's, everyone else the first stream's
+        owner = timetable_owner(request.user)
+        if owner:
+            kind, timetable_owner_instance = owner
+            timetable_page = rendered_grids(kind, [timetable_owner_instance])
+            free_time_windows = free_windows(kind, timetable_owner_instance.pk)
+        else:
+            timetable_page = grid_page(Stream.objects.order_by('id')[:1], build=rendered_grids)
         
         if request.method == 'POST' and 'add_task' in request.POST:
             form = TaskForm(request.POST)
@@ -74,18 +105,32 @@ def dashboard(request):
                 task.save()
                 return redirect('dashboard')
         
-        scheduled_tasks = Task.objects.filter(user=request.user, is_scheduled=True, is_completed=False).order_by('priority')
-        pending_tasks = Task.objects.filter(user=request.user, is_scheduled=False, is_completed=False).order_by('priority')
+        scheduled_tasks = sorted(Task.objects.filter(user=request.user, is_scheduled=True, is_completed=False).order_by('priority_rank', 'id'), key=schedule_order)
+        pending_tasks = Task.objects.filter(user=request.user, is_scheduled=False, is_completed=False).order_by('priority_rank', 'id')
     
     if selected_location_type:
         locations = locations.filter(location_type=selected_location_type)
     if selected_location_floor:
         locations = locations.filter(floor=selected_location_floor)
+    locations = list(locations)
+    for location in locations:
+        location.feed_url = feed_url('location', location.pk)
+
+    # Free room search panel; the occupancy map is only needed once a search is made
+    room_slots = TimeSlot.objects.order_by('start_time', 'id').values_list('id', 'start_time', 'end_time')
+    free_room_search = None
+    if request.GET.get('room_day'):
+        occupancy = occupancy_map()
+        params = {name: request.GET.get(f'room_{name}', '') for name in ('day', 'start', 'slots', 'type', 'floor')}
+        try:
+            free_room_search = {'rooms': free_rooms(occupancy, **parse_free_room_query(params, occupancy))}
+        except ValueError as e:
+            free_room_search = {'error': str(e)}
 
     context = {
         'streams': streams,
         'selected_stream_id': selected_stream_id,
-        'timetable_entries': timetable_entries,
+        'timetable_page': timetable_page,
         'locations': locations,
         'location_types': location_types,
         'selected_location_type': selected_location_type,
@@ -93,8 +138,13 @@ def dashboard(request):
         'form': form,
         'scheduled_tasks': scheduled_tasks,
         'pending_tasks': pending_tasks,
+        'free_time_windows': free_time_windows,
         'all_users': all_users,
         'role_choices': CustomUser.ROLE_CHOICES,
+        'latest_job': latest_job,
+        'day_choices': TimetableEntry.DAY_CHOICES,
+        'room_slots': room_slots,
+        'free_room_search': free_room_search,
     }
     
     return render(request, 'timetable_app/dashboard.html', context)
@@ -109,24 +159,27 @@ def complete_task(request, task_id):
 @login_required
 def reschedule_tasks(request):
     if request.method == 'POST':
+        # Without a number of free minutes, tasks go into the free windows of the user's timetable
         free_time_str = request.POST.get('free_time')
-        try:
-            minutes = int(free_time_str)
-            available_time = timedelta(minutes=minutes)
-        except (ValueError, TypeError):
-            return redirect('dashboard')
-        
-        Task.objects.filter(user=request.user, is_scheduled=True, is_completed=False).update(is_scheduled=False)
-        
-        pending_tasks = Task.objects.filter(user=request.user, is_scheduled=False, is_completed=False).order_by('priority')
-        
-        for pending_task in pending_tasks:
-            if pending_task.estimated_time <= available_time:
-                pending_task.is_scheduled = True
-                pending_task.save()
-                available_time -= pending_task.estimated_time
-            else:
-                break
+        owner = timetable_owner(request.user)
+        minutes = None
+        if free_time_str or not owner:
+            try:
+                minutes = int(free_time_str)
+            except (ValueError, TypeError):
+                return redirect('dashboard')
+
+        # The modal is opened by "Mark as Complete" and carries the finished task
+        task_id = request.POST.get('task_id')
+        if task_id and task_id.isdigit():
+            Task.objects.filter(id=task_id, user=request.user).update(is_completed=True, is_scheduled=False)
+
+        if minutes is None:
+            kind, timetable_owner_instance = owner
+            windows = upcoming_windows(free_windows(kind, timetable_owner_instance.pk), timezone.localtime())
+            schedule_user_tasks(request.user, windows)
+        else:
+            reschedule_user_tasks(request.user, minutes)
     return redirect('dashboard')
 
 @login_required
@@ -148,65 +201,174 @@ def run_generator_view(request):
     if not request.user.is_superuser and not request.user.role == 'admin':
         return HttpResponse("You are not authorized to perform this action.")
     
-    validator = ValidateCommand()
-    is_valid = validator.handle()
+    errors = find_data_errors()
+    if errors:
+        return render(request, 'timetable_app/validation_error.html', {'errors': errors})
 
-    if is_valid:
-        generate_timetable()
-        return redirect('dashboard')
-    else:
-        # The validator will print errors to the console, but we can't capture them here.
-        # This is a simplified approach to avoid the bug.
-        return render(request, 'timetable_app/validation_error.html', {'errors': ["Validation failed. Please check the terminal for details."]})
+    # Generation runs in the background; the dashboard polls the job's status
+    submit_generation_job(user=request.user)
+    return redirect('dashboard')
+
+@login_required
+def generation_job_status(request, job_id):
+    if not request.user.is_superuser and not request.user.role == 'admin':
+        return HttpResponse("You are not authorized to perform this action.")
+
+    fail_abandoned_jobs()
+    job = get_object_or_404(GenerationJob, id=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'kind': job.kind,
+        'engine': job.engine,
+        'placed_lectures': job.placed_lectures,
+        'total_lectures': job.total_lectures,
+        'elapsed_seconds': job.elapsed_seconds(),
+        'errors': job.errors,
+    })
         
 @login_required
 def download_timetable(request):
-    selected_stream_id = request.GET.get('stream_id')
-    if selected_stream_id:
-        timetable_entries = TimetableEntry.objects.filter(stream__id=selected_stream_id).order_by('day_of_week', 'timeslot__start_time')
-    else:
-        timetable_entries = TimetableEntry.objects.all().order_by('day_of_week', 'timeslot__start_time')
-        
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="timetable.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Stream', 'Day', 'Time', 'Subject', 'Professor', 'Location'])
-    
-    for entry in timetable_entries:
-        writer.writerow([
-            entry.stream,
-            entry.get_day_of_week_display(),
-            entry.timeslot,
-            entry.subject.name,
-            entry.professor.name,
-            entry.location.name
-        ])
-    return response
+    rows = timetable_rows(request.GET.get('stream_id'))
+    header = ['Stream', 'Day', 'Time', 'Subject', 'Professor', 'Location']
+    return StreamingHttpResponse(
+        csv_lines(header, rows),
+        content_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="timetable.csv"'},
+    )
 
 @login_required
 def download_location_sheet(request):
-    locations = Location.objects.all()
-    
-    filter_type = request.GET.get('location_type')
-    filter_floor = request.GET.get('floor')
-    
-    if filter_type:
-        locations = locations.filter(location_type=filter_type)
-    if filter_floor:
-        locations = locations.filter(floor=filter_floor)
+    rows = location_rows(request.GET.get('location_type'), request.GET.get('floor'))
+    return StreamingHttpResponse(
+        csv_lines(['Name', 'Type', 'Floor'], rows),
+        content_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="locations.csv"'},
+    )
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="locations.csv"'
+# Professor load, room utilization and stream gaps of the live timetable, read
+# from the summaries written at the end of its generation run
+@login_required
+def utilization_report(request):
+    if not request.user.is_superuser and not request.user.role == 'admin':
+        return HttpResponse("You are not authorized to view this page.")
+    version = active_version()
+    reports = []
+    if version:
+        for kind, (_, header, _, _) in UTILIZATION_REPORTS.items():
+            reports.append({'kind': kind, 'header': header, 'rows': list(report_rows(kind, version))})
+    return render(request, 'timetable_app/utilization_report.html', {'version': version, 'reports': reports})
 
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Type', 'Floor'])
-    
-    for location in locations:
-        writer.writerow([location.name, location.get_location_type_display(), location.floor])
+@login_required
+def download_utilization_report(request, kind):
+    if not request.user.is_superuser and not request.user.role == 'admin':
+        return HttpResponse("You are not authorized to perform this action.")
+    if kind not in UTILIZATION_REPORTS:
+        raise Http404("No such report.")
+    version = active_version()
+    rows = report_rows(kind, version).iterator(chunk_size=EXPORT_CHUNK_SIZE) if version else []
+    return StreamingHttpResponse(
+        csv_lines(UTILIZATION_REPORTS[kind][1], rows),
+        content_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{kind}-utilization.csv"'},
+    )
+
+# The active timetable version, looked up once per request (feeds and API)
+def _request_version(request):
+    if not hasattr(request, '_timetable_version'):
+        request._timetable_version = active_version()
+    return request._timetable_version
+
+def _request_cache_version(request):
+    version = _request_version(request)
+    return f'{version.pk}.{version.revision}' if version else 'none'
 
+def _feed_etag(request, kind, pk):
+    return f'{kind}-{pk}-{_request_cache_version(request)}'
+
+def _feed_last_modified(request, kind, pk):
+    version = _request_version(request)
+    return version.activated_at if version else None
+
+# ETag and Last-Modified only need the version row, so unchanged polls get a 304
+# without reading any timetable entries
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def _timetable_feed(request, kind, pk):
+    model = FEED_KINDS[kind][0]
+    owner = get_object_or_404(model, pk=pk)
+    key = f'timetable-ics:{kind}:{pk}'
+    body = cache.get(key, version=_request_cache_version(request))
+    if body is None:
+        body = build_calendar(kind, owner, _request_version(request))
+        cache.set(key, body, version=_request_cache_version(request))
+    response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{kind}-{pk}.ics"'
     return response
 
+# iCalendar feed of a stream, professor or location. Calendar apps cannot log in,
+# so access is checked with the signed token in the feed URL instead.
+def timetable_feed(request, kind, pk):
+    if kind not in FEED_KINDS or not valid_feed_token(kind, pk, request.GET.get('token', '')):
+        raise Http404("No such calendar feed.")
+    return _timetable_feed(request, kind, pk)
+
+def _entries_api_etag(request, query):
+    return entry_etag(_request_cache_version(request), request.GET)
+
+@condition(etag_func=_entries_api_etag)
+def _timetable_entries_api(request, query):
+    results, next_after = entry_page(query)
+    next_url = None
+    if next_after is not None:
+        params = request.GET.copy()
+        params['after'] = next_after
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return JsonResponse({
+        'version': _request_cache_version(request),
+        'count': len(results),
+        'next': next_url,
+        'results': results,
+    })
+
+# Read-only JSON API over the live timetable entries. Filters: stream, professor,
+# location, timeslot (ids, comma-separated), day (mon..fri). fields picks the
+# columns, limit/after page through the entries by id (follow 'next').
+@require_safe
+def timetable_entries_api(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        query = parse_entry_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return _timetable_entries_api(request, query)
+
+def _room_json(room):
+    return {'id': room.id, 'name': room.name, 'type': room.location_type, 'floor': room.floor}
+
+# Rooms free for a run of consecutive slots: day (mon..fri), start (HH:MM, any
+# time within the first slot), slots (how many, default 1) and optionally type
+# and floor. Answered from the in-memory occupancy map, not from the entries.
+@require_safe
+def free_rooms_api(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    occupancy = occupancy_map()
+    try:
+        query = parse_free_room_query(request.GET, occupancy)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rooms = free_rooms(occupancy, **query)
+    first, last = occupancy.slots[query['first']], occupancy.slots[query['first'] + query['count'] - 1]
+    return JsonResponse({
+        'version': occupancy.version,
+        'day': query['day'],
+        'start': first[1].strftime('%H:%M'),
+        'end': last[2].strftime('%H:%M'),
+        'count': len(rooms),
+        'results': [_room_json(room) for room in rooms],
+    })
+
 # New data management views
 
 @login_required
@@ -232,6 +394,39 @@ def manage_data(request):
     
     return render(request, 'timetable_app/manage_data.html', context)
 
+# Upload of a CSV or JSON Lines file through importer.import_data
+@login_required
+def import_data_view(request):
+    if not request.user.is_superuser and not request.user.role == 'admin':
+        return HttpResponse("You are not authorized to import data.")
+
+    counts = None
+    errors = []
+    form = DataImportForm()
+    if request.method == 'POST':
+        form = DataImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                file_format = format_for(upload.name)
+                file = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+                counts = import_data([(form.cleaned_data['kind'], file, file_format)])
+                # Like an edit, the streams the import marked stale are regenerated in the background
+                if Stream.objects.filter(needs_regeneration=True).exists() and live_entries().exists():
+                    submit_generation_job(user=request.user, kind='incremental')
+            except ValueError as e:
+                form.add_error('file', str(e))
+            except DataImportError as e:
+                form.add_error('file', f'{e} Nothing was imported.')
+                errors = e.errors
+
+    return render(request, 'timetable_app/import_data.html', {
+        'form': form,
+        'counts': counts,
+        'errors': errors,
+        'columns': import_columns(),
+    })
+
 @login_required
 def add_data(request, model_name):
     if not request.user.is_superuser and not request.user.role == 'admin':
@@ -253,7 +448,8 @@ def add_data(request, model_name):
     if request.method == 'POST':
         form = FormClass(request.POST)
         if form.is_valid():
-            form.save()
+            instance = form.save()
+            refresh_timetable(affected_stream_ids(instance), request.user)
             return redirect('manage_data')
     else:
         form = FormClass()
@@ -284,7 +480,9 @@ def edit_data(request, model_name, pk):
     if request.method == 'POST':
         form = FormClass(request.POST, instance=instance)
         if form.is_valid():
+            stream_ids = affected_stream_ids(instance)
             form.save()
+            refresh_timetable(stream_ids | affected_stream_ids(instance), request.user)
             return redirect('manage_data')
     else:
         form = FormClass(instance=instance)
@@ -311,6 +509,8 @@ def delete_data(request, model_name, pk):
         return HttpResponse("Invalid model name.")
 
     instance = get_object_or_404(ModelClass, pk=pk)
+    stream_ids = affected_stream_ids(instance)
     instance.delete()
+    refresh_timetable(stream_ids, request.user)
     
     return redirect('manage_data')
\ No newline at end of file